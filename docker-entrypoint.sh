@@ -0,0 +1,9 @@
+#!/bin/bash
+# Render Claude's global state file from the container environment, then run
+# the container command.
+set -e
+
+envsubst '${ANTHROPIC_API_KEY}' < /home/agent/.claude.json.template > /home/agent/.claude.json
+chmod 600 /home/agent/.claude.json
+
+exec "$@"
@@ -2,7 +2,16 @@
 
 __version__ = "0.1.0"
 
-from .manager import AgentManager
-from .store import AgentStore
 
-__all__ = ['AgentManager', 'AgentStore', 'AgentProcess']
+def __getattr__(name):
+    # Import lazily so `fl --help` doesn't load the manager and its dependencies
+    if name == 'AgentManager':
+        from .manager import AgentManager
+        return AgentManager
+    if name == 'AgentStore':
+        from .store import AgentStore
+        return AgentStore
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ['AgentManager', 'AgentStore']
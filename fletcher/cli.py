@@ -1,43 +1,141 @@
 """Fletcher - Run Claude Code in isolated containers."""
 import click
+import logging
+import re
 import sys
-from tabulate import tabulate
 from typing import Optional
 
-from .manager import AgentManager
-from . import utils
+_strip_ansi = re.compile(r'\x1b\[[0-9;]*m').sub
+
+
+def _configure_logging(level: int = logging.INFO):
+    """Send fletcher's progress messages to stdout through one shared handler."""
+    logger = logging.getLogger('fletcher')
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level)
+
+
+# Styled once rather than per row
+_STATUS_STYLED = {
+    'running': click.style('running', fg='green'),
+    'error': click.style('error', fg='red'),
+    'stopped': click.style('stopped', fg='yellow'),
+}
+
+
+def _shorten_repo(repo: str) -> str:
+    return '...' + repo[-47:] if len(repo) > 50 else repo
+
+
+def _format_table(headers: list, rows: list) -> str:
+    """Render rows like tabulate's 'simple' format, ignoring ANSI colour codes."""
+    table = [headers] + rows
+    visible = [[len(_strip_ansi('', cell)) for cell in row] for row in table]
+    widths = [max(column) for column in zip(*visible)]
+
+    lines = []
+    for row, lengths in zip(table, visible):
+        lines.append('  '.join(
+            cell + ' ' * (width - length)
+            for cell, width, length in zip(row, widths, lengths)
+        ).rstrip())
+    lines.insert(1, '  '.join('-' * width for width in widths))
+    return '\n'.join(lines)
+
+
+class _CliContext:
+    """Per-invocation state shared by the commands through ctx.obj.
+
+    The manager (and with it the SQLite store) is only opened when a
+    command first asks for it, and it is closed when the command ends.
+    """
+
+    def __init__(self):
+        self._manager = None
+
+    @property
+    def manager(self):
+        if self._manager is None:
+            from .manager import AgentManager
+            self._manager = AgentManager()
+        return self._manager
+
+    def close(self):
+        if self._manager is not None:
+            self._manager.close()
 
 
 @click.group()
 @click.version_option(version="0.1.0")
-def cli():
+@click.pass_context
+def cli(ctx):
     """Fletcher - Run Claude Code in isolated containers while syncing with your IDE.
 
     Each agent runs in its own Docker container with a fresh git clone.
     """
-    pass
+    _configure_logging()
+    ctx.obj = _CliContext()
+    ctx.call_on_close(ctx.obj.close)
+
+    if ctx.invoked_subcommand == 'spawn':
+        # Overlap the base image pull and build with validation and the clone
+        from . import docker_utils
+        docker_utils.start_prepull()
+        docker_utils.prewarm_image()
 
 
 @cli.command()
-@click.argument('repo_url')
-def spawn(repo_url: str):
-    manager = AgentManager()
+@click.argument('repo_urls', nargs=-1, required=True)
+@click.option('--quiet', '-q', is_flag=True, help='Only show warnings and errors while spawning')
+@click.option('--full-history', is_flag=True,
+              help='Clone every branch with full history and tags (default: latest commit only)')
+@click.pass_obj
+def spawn(obj: _CliContext, repo_urls: tuple, quiet: bool, full_history: bool):
+    if quiet:
+        _configure_logging(logging.WARNING)
+
+    from . import utils
+    manager = obj.manager
+    depth = None if full_history else 1
 
     try:
         utils.validate_claude_cli()
         utils.validate_docker()
-        utils.validate_repo_url(repo_url)
+        for repo_url in repo_urls:
+            utils.validate_repo_url(repo_url)
 
-        click.echo(f"Spawning agent for repository: {repo_url}")
-        click.echo(click.style("Using isolated Docker container with network access", fg='yellow'))
+        if len(repo_urls) == 1:
+            repo_url = repo_urls[0]
+            click.echo(f"Spawning agent for repository: {repo_url}")
+            click.echo(click.style("Using isolated Docker container with network access", fg='yellow'))
 
-        agent_id = manager.spawn_agent(repo_url)
-        click.echo(click.style(f"\nAgent spawned successfully!", fg='green'))
-        click.echo(f"Agent ID: {agent_id}")
+            agent_id = manager.spawn_agent(repo_url, depth=depth)
+            click.echo(click.style(f"\nAgent spawned successfully!", fg='green'))
+            click.echo(f"Agent ID: {agent_id}")
 
-        agent = manager.get_agent(agent_id)
-        click.echo(f"Working directory: {agent['working_dir']}")
-        click.echo(f"\nUse 'fl attach {agent_id}' to connect to the agent.")
+            agent = manager.get_agent(agent_id)
+            click.echo(f"Working directory: {agent['working_dir']}")
+            click.echo(f"\nUse 'fl attach {agent_id}' to connect to the agent.")
+            return
+
+        click.echo(f"Spawning {len(repo_urls)} agents in parallel...")
+        click.echo(click.style("Using isolated Docker containers with network access", fg='yellow'))
+
+        failed = 0
+        for repo_url, agent_id, error in manager.spawn_agents(repo_urls, depth=depth):
+            if error:
+                failed += 1
+                click.echo(click.style(f"Failed {repo_url}: {error}", fg='red'))
+            else:
+                click.echo(click.style(f"Spawned {agent_id} for {repo_url}", fg='green'))
+
+        click.echo("\nUse 'fl attach <agent-id>' or 'fl attach --all' to connect.")
+        if failed:
+            sys.exit(1)
     except Exception as e:
         click.echo(click.style(f"Error: {e}", fg='red'))
         sys.exit(1)
@@ -46,8 +144,9 @@ def spawn(repo_url: str):
 @cli.command()
 @click.option('--status', '-s', type=click.Choice(['spawning', 'running', 'stopped', 'error']),
               help='Filter by status')
-def list(status: Optional[str]):
-    manager = AgentManager()
+@click.pass_obj
+def list(obj: _CliContext, status: Optional[str]):
+    manager = obj.manager
 
     try:
         agents = manager.list_agents(status=status)
@@ -60,32 +159,18 @@ def list(status: Optional[str]):
             return
 
         headers = ['ID', 'Status', 'Repository', 'PID', 'Created']
-        rows = []
-
-        for agent in agents:
-            repo = agent['repo_url']
-            if len(repo) > 50:
-                repo = '...' + repo[-47:]
-
-            created = agent['created_at'].split('T')[0]
-
-            status_display = agent['status']
-            if agent['status'] == 'running':
-                status_display = click.style(status_display, fg='green')
-            elif agent['status'] == 'error':
-                status_display = click.style(status_display, fg='red')
-            elif agent['status'] == 'stopped':
-                status_display = click.style(status_display, fg='yellow')
-
-            rows.append([
+        rows = [
+            [
                 agent['id'],
-                status_display,
-                repo,
-                agent['pid'] or '-',
-                created
-            ])
-
-        click.echo(tabulate(rows, headers=headers, tablefmt='simple'))
+                _STATUS_STYLED.get(agent['status'], agent['status']),
+                _shorten_repo(agent['repo_url']),
+                str(agent['pid'] or '-'),
+                agent['created_at'].split('T')[0],
+            ]
+            for agent in agents
+        ]
+
+        click.echo(_format_table(headers, rows))
         click.echo(f"\nTotal: {len(agents)} agent(s)")
 
     except Exception as e:
@@ -97,25 +182,15 @@ def list(status: Optional[str]):
 @click.argument('agent_id', required=False)
 @click.option('--all', '-a', 'attach_all', is_flag=True,
               help='Attach to all running agents in split view')
-def attach(agent_id: Optional[str], attach_all: bool):
-    manager = AgentManager()
+@click.pass_obj
+def attach(obj: _CliContext, agent_id: Optional[str], attach_all: bool):
+    manager = obj.manager
 
     try:
         if attach_all:
             manager.attach_all_agents()
         elif agent_id:
             click.echo(f"Attaching to agent {agent_id}...")
-            from . import docker_utils
-            container_name = f"agent-{agent_id}"
-            # Always enable mouse mode in tmux for easier interaction
-            try:
-                docker_utils.exec_in_container(
-                    container_name,
-                    ['tmux', 'set-option', '-t', 'claude', 'mouse', 'on'],
-                    detach=False
-                )
-            except:
-                pass  # Silently fail if tmux command fails
             manager.attach_agent(agent_id)
         else:
             click.echo(click.style("Error: Must provide AGENT_ID or use --all flag", fg='red'))
@@ -134,8 +209,9 @@ def attach(agent_id: Optional[str], attach_all: bool):
 
 @cli.command()
 @click.argument('agent_id')
-def info(agent_id: str):
-    manager = AgentManager()
+@click.pass_obj
+def info(obj: _CliContext, agent_id: str):
+    manager = obj.manager
 
     try:
         agent = manager.get_agent(agent_id)
@@ -161,8 +237,9 @@ def info(agent_id: str):
 @click.argument('agent_id')
 @click.option('--keep-workdir', '-k', is_flag=True,
               help='Keep the working directory (only stop the process)')
-def stop(agent_id: str, keep_workdir: bool):
-    manager = AgentManager()
+@click.pass_obj
+def stop(obj: _CliContext, agent_id: str, keep_workdir: bool):
+    manager = obj.manager
 
     try:
         manager.stop_agent(agent_id, remove_workdir=not keep_workdir)
@@ -183,8 +260,9 @@ def stop(agent_id: str, keep_workdir: bool):
 @cli.command()
 @click.argument('agent_id')
 @click.confirmation_option(prompt='Are you sure you want to delete this agent?')
-def delete(agent_id: str):
-    manager = AgentManager()
+@click.pass_obj
+def delete(obj: _CliContext, agent_id: str):
+    manager = obj.manager
 
     try:
         manager.delete_agent(agent_id)
@@ -204,9 +282,10 @@ def delete(agent_id: str):
 @click.option('--all', '-a', 'clean_all', is_flag=True,
               help='Clean all agents regardless of status')
 @click.confirmation_option(prompt='Are you sure you want to clean agents?')
-def clean(status: Optional[str], clean_all: bool):
-    from . import docker_utils
-    manager = AgentManager()
+@click.pass_obj
+def clean(obj: _CliContext, status: Optional[str], clean_all: bool):
+    from . import docker_utils, utils
+    manager = obj.manager
 
     try:
         # Clean agent records
@@ -221,6 +300,10 @@ def clean(status: Optional[str], clean_all: bool):
             filter_msg = "any" if clean_all else status
             click.echo(f"No {filter_msg} agents to clean.")
 
+        swept = manager.sweep_discarded_workdirs()
+        if swept > 0:
+            click.echo(f"Removed {swept} leftover working director{'y' if swept == 1 else 'ies'}.")
+
         # Clean Docker resources
         click.echo("\nCleaning Docker resources...")
         utils.validate_docker()
@@ -228,16 +311,16 @@ def clean(status: Optional[str], clean_all: bool):
         cleaned_containers = 0
         agent_containers = docker_utils.list_containers(
             all_containers=True,
-            filter_name='agent-'
+            filter_name=utils.CONTAINER_PREFIX
         )
-        for container in agent_containers:
-            if docker_utils.remove_container(container, force=True):
+        for container, removed in docker_utils.bulk_remove(agent_containers, force=True).items():
+            if removed:
                 cleaned_containers += 1
                 click.echo(f"  Removed container: {container}")
 
         # Prune dangling images
         docker_utils.prune_images()
-        click.echo("  Pruned dangling images")
+        click.echo("  Pruned dangling agent images")
 
         if cleaned_containers > 0:
             click.echo(click.style(f"Cleaned {cleaned_containers} container(s).", fg='green'))
@@ -249,5 +332,27 @@ def clean(status: Optional[str], clean_all: bool):
         sys.exit(1)
 
 
+@cli.command()
+@click.pass_obj
+def daemon(obj: _CliContext):
+    """Keep agent statuses current from Docker events until interrupted.
+
+    While it runs, other fl commands trust the stored statuses instead of
+    querying Docker.
+    """
+    from . import utils
+    manager = obj.manager
+
+    try:
+        utils.validate_docker()
+        click.echo("Watching Docker events for agent exits. Press Ctrl+C to stop.")
+        manager.run_status_daemon()
+    except KeyboardInterrupt:
+        click.echo("\nStopped.")
+    except Exception as e:
+        click.echo(click.style(f"Error: {e}", fg='red'))
+        sys.exit(1)
+
+
 if __name__ == '__main__':
     cli()
@@ -0,0 +1,114 @@
+"""Warm pool of idle agent containers."""
+import os
+import secrets
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from . import docker_utils
+
+POOL_PREFIX = "agent-pool-"
+POOL_LABEL = "fletcher.pool"
+POOL_MOUNT = "/agents"
+
+
+class ContainerPool:
+    """Idle containers kept running so a spawn only pays for `docker exec`.
+
+    Pooled containers are started before the agent's clone exists, so they
+    mount the whole agents base directory at /agents instead of a single
+    working directory. That weakens isolation between agents, so the pool is
+    disabled unless FLETCHER_POOL_SIZE is set.
+    """
+
+    def __init__(
+        self,
+        base_dir: str,
+        env_vars: Optional[Dict[str, str]] = None,
+        size: Optional[int] = None,
+        idle_timeout: Optional[float] = None,
+        network_mode: str = "bridge",
+    ):
+        self.base_dir = str(Path(base_dir).resolve())
+        self.env_vars = env_vars or {}
+        self.network_mode = network_mode
+
+        if size is None:
+            size = int(os.environ.get('FLETCHER_POOL_SIZE', '0'))
+        if idle_timeout is None:
+            idle_timeout = float(os.environ.get('FLETCHER_POOL_IDLE_TIMEOUT', '300'))
+
+        self.size = size
+        self.idle_timeout = idle_timeout
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def workspace_for(self, working_dir: str) -> str:
+        """Path of an agent's working directory inside a pooled container."""
+        relative = Path(working_dir).resolve().relative_to(self.base_dir)
+        return f"{POOL_MOUNT}/{relative.as_posix()}"
+
+    def acquire(self, container_name: str) -> Optional[str]:
+        """Claim an idle container, renaming it to `container_name`.
+
+        Returns None when the pool is disabled or empty; the caller should then
+        create a container itself. The pool is topped up in the background.
+        """
+        if not self.enabled:
+            return None
+
+        build_hash = docker_utils.compute_build_hash()
+        now = time.time()
+        acquired = None
+        idle = 0
+
+        for name in docker_utils.list_containers(
+            all_containers=False,
+            filter_name=POOL_PREFIX,
+            filter_labels={f'{POOL_LABEL}.base': self.base_dir},
+        ):
+            parsed = self._parse_name(name)
+            stale = (
+                parsed is None
+                or parsed[0] != build_hash[:12]
+                or now - parsed[1] > self.idle_timeout
+            )
+            if stale:
+                docker_utils.remove_container(name, force=True)
+            elif acquired is None and docker_utils.rename_container(name, container_name):
+                acquired = container_name
+            else:
+                idle += 1
+
+        self.refill(idle, build_hash)
+        return acquired
+
+    def refill(self, idle: int, build_hash: Optional[str] = None):
+        """Start enough background `docker run`s to bring the pool to size."""
+        build_hash = build_hash or docker_utils.compute_build_hash()
+
+        for _ in range(self.size - idle):
+            docker_utils.create_container_background(
+                container_name=self._new_name(build_hash),
+                working_dir=self.base_dir,
+                network_mode=self.network_mode,
+                auto_remove=True,
+                env_vars=self.env_vars,
+                mount_point=POOL_MOUNT,
+                tmpfs=docker_utils.DEFAULT_TMPFS,
+                labels={POOL_LABEL: '1', f'{POOL_LABEL}.base': self.base_dir},
+            )
+
+    @staticmethod
+    def _new_name(build_hash: str) -> str:
+        return f"{POOL_PREFIX}{build_hash[:12]}-{int(time.time())}-{secrets.token_hex(3)}"
+
+    @staticmethod
+    def _parse_name(name: str):
+        try:
+            image_hash, created, _ = name[len(POOL_PREFIX):].split('-')
+            return image_hash, int(created)
+        except ValueError:
+            return None
@@ -1,14 +1,31 @@
 """Container-based process management for Claude Code CLI agents."""
+import logging
 import os
+import shlex
+import signal
 import time
-import json
-from typing import Optional
+import threading
+from typing import Dict, Optional
 from pathlib import Path
 from dotenv import load_dotenv
 from .store import AgentStore
+from .container_pool import ContainerPool
 from . import docker_utils
 from . import utils
 
+# Parallel spawns must not build the agent image more than once
+_image_lock = threading.Lock()
+
+# Seconds Claude gets to exit after SIGTERM before Docker sends SIGKILL
+STOP_TIMEOUT = 10
+
+# .env lives in the project root (two levels up from this file)
+_ENV_FILE_PATH = Path(__file__).resolve().parent.parent / '.env'
+_ENV_CACHE: Optional[dict] = None
+_ENV_CACHE_MTIME: Optional[float] = None
+
+logger = logging.getLogger(__name__)
+
 
 class ContainerAgentProcess:
 
@@ -16,34 +33,71 @@ class ContainerAgentProcess:
         self.agent_id = agent_id
         self.working_dir = working_dir
         self.store = store
-        self.container_name = f"agent-{agent_id}"
+        self.container_name = utils.container_name(agent_id)
         self.container_id: Optional[str] = None
+        self.workspace = "/workspace"
+        # Every container fletcher starts is run with --rm
+        self.auto_remove = True
+        # Container State from the last inspect(); None until inspected
+        self._state: Optional[Dict] = None
+        self._inspected = False
 
-    def spawn_interactive(self) -> str:
-        if not docker_utils.image_exists():
-            print("Building agent Docker image (this may take a few minutes)...")
-            if not docker_utils.build_agent_image():
-                raise RuntimeError("Failed to build agent Docker image")
-        else:
-            print("Using existing agent Docker image...")
+    def _ensure_image(self):
+        # A background prewarm build may already be producing the image
+        docker_utils.wait_for_prewarm()
+        with _image_lock:
+            if not docker_utils.image_up_to_date():
+                logger.info("Building agent Docker image (this may take a few minutes)...")
+                docker_utils.wait_for_prepull()
+                if not docker_utils.build_agent_image():
+                    raise RuntimeError("Failed to build agent Docker image")
+            else:
+                logger.info("Using existing agent Docker image...")
+
+    def prepare(self) -> str:
+        """Build the image and start the container, without launching Claude.
 
+        Safe to run before the repository is cloned: the working directory
+        is bind-mounted, so the clone shows up in the running container.
+        """
+        self._ensure_image()
         try:
-            if docker_utils.container_exists(self.container_name):
-                docker_utils.remove_container(self.container_name, force=True)
+            # A 404 from a missing container is fine; only leftovers need removing
+            docker_utils.remove_container(self.container_name, force=True)
 
             env_vars = self._load_env_vars()
-            print(f"Creating isolated container for agent {self.agent_id}...")
-            self.container_id = docker_utils.create_container(
-                container_name=self.container_name,
-                working_dir=self.working_dir,
-                network_mode="bridge",
-                auto_remove=True,
-                env_vars=env_vars,
-            )
-            print(f"Container created: {self.container_id[:12]}")
+            pool = ContainerPool(Path(self.working_dir).parent, env_vars=env_vars)
+            self.container_id = pool.acquire(self.container_name)
+
+            if self.container_id:
+                self.workspace = pool.workspace_for(self.working_dir)
+                logger.info(f"Using warm container for agent {self.agent_id}")
+            else:
+                logger.info(f"Creating isolated container for agent {self.agent_id}...")
+                try:
+                    self.container_id = self._create_container(env_vars)
+                except RuntimeError as e:
+                    # The image was removed behind our back; rebuild it once
+                    if 'Unable to find image' not in str(e) and 'No such image' not in str(e):
+                        raise
+                    docker_utils.invalidate_image_cache()
+                    self._ensure_image()
+                    self.container_id = self._create_container(env_vars)
+                logger.info(f"Container created: {self.container_id[:12]}")
 
-            # Give the container a moment to fully start
-            time.sleep(0.5)
+            self._wait_ready()
+            return self.container_id
+        except Exception:
+            if self.container_id:
+                docker_utils.remove_container(self.container_id, force=True)
+                self.container_id = None
+            raise
+
+    def spawn_interactive(self) -> str:
+        previous_handlers = self._install_signal_handlers()
+        try:
+            if self.container_id is None:
+                self.prepare()
 
             self._start_claude()
             return self.container_id
@@ -51,98 +105,186 @@ class ContainerAgentProcess:
             if self.container_id:
                 docker_utils.remove_container(self.container_id, force=True)
             raise RuntimeError(f"Failed to spawn agent in container: {e}")
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+    def _create_container(self, env_vars: dict) -> str:
+        return docker_utils.create_container(
+            container_name=self.container_name,
+            working_dir=self.working_dir,
+            network_mode="bridge",
+            auto_remove=self.auto_remove,
+            env_vars=env_vars,
+            tmpfs=docker_utils.DEFAULT_TMPFS,
+        )
+
+    def _install_signal_handlers(self) -> dict:
+        """Turn SIGTERM, like SIGINT, into KeyboardInterrupt during a spawn.
+
+        Teardown is left to the caller's exception handling rather than done
+        in the handler, where a graceful stop could block for STOP_TIMEOUT.
+        """
+        # Handlers can only be installed from the main thread; parallel
+        # spawns run in workers and rely on the caller for cleanup.
+        if threading.current_thread() is not threading.main_thread():
+            return {}
+
+        def handle(signum, frame):
+            raise KeyboardInterrupt
+
+        return {
+            signum: signal.signal(signum, handle)
+            for signum in (signal.SIGINT, signal.SIGTERM)
+        }
+
+    def _wait_ready(self, timeout: float = 2.0) -> bool:
+        """Poll until the container reports running, backing off 25ms -> 100ms."""
+        deadline = time.monotonic() + timeout
+        delay = 0.025
+
+        while True:
+            state = docker_utils.get_container_state(self.container_id)
+            if state and state.get('Running', False):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
 
     def _start_claude(self):
         try:
-            # Global state file to skip onboarding
-            global_state_json = json.dumps({
-                "hasCompletedOnboarding": True,
-                "hasTrustDialogHooksAccepted": True,
-                "primaryApiKey": os.getenv('ANTHROPIC_API_KEY'),
-                "theme": "dark",
-                "autoUpdates": "true",
-                "bypassPermissionsModeAccepted": "true",
-            })
-
-            # Use /home/agent since container runs as non-root 'agent' user
-            docker_utils.exec_in_container(
-                self.container_id,
-                ['bash', '-c', f'echo \'{global_state_json}\' > /home/agent/.claude.json',],
-                detach=False
-            )
+            # ~/.claude.json is rendered by the image entrypoint from the
+            # ANTHROPIC_API_KEY passed in the container env
+            claude_cmd = 'claude --model claude-opus-4-5-20251101 --dangerously-skip-permissions'
 
-            # Configure gh CLI with the GitHub PAT if available
-            github_pat = os.getenv('GITHUB_PAT')
-            if github_pat:
-                print("Configuring GitHub CLI authentication...")
-                docker_utils.exec_in_container(
-                    self.container_id,
-                    ['bash', '-c', f'echo {github_pat} | gh auth login --with-token'],
-                    detach=False
-                )
+            # Run the setup steps in one exec to avoid a docker round-trip each
+            steps = []
 
-            # Start Claude in a detached tmux session named 'claude'
-            docker_utils.exec_in_container(
-                self.container_id,
-                ['bash', '-c', 'tmux new-session -d -s claude claude --model claude-opus-4-5-20251101 --dangerously-skip-permissions'],
-                detach=False
+            # Configure gh CLI with the GitHub PAT passed in the container env
+            if os.getenv('GITHUB_PAT'):
+                logger.info("Configuring GitHub CLI authentication...")
+                steps.append('printenv GITHUB_PAT | gh auth login --with-token')
+
+            # Start Claude in a detached tmux session named 'claude' with
+            # mouse mode on (it lasts for the session, so attaches needn't
+            # set it), wait until it has drawn its UI, then send Escape to it
+            steps.append(
+                f'tmux new-session -d -s claude -c {shlex.quote(self.workspace)} {claude_cmd}'
             )
+            steps.append('tmux set-option -t claude mouse on')
+            steps.append(self._wait_for_claude_script())
+            steps.append('tmux send-keys -t claude C-[')
 
-            # Send keypress '1' followed by Enter to the tmux session
-            print("Sending keypress 'Escape'...")
-            docker_utils.exec_in_container(
+            process, reader = docker_utils.exec_in_container_streaming(
                 self.container_id,
-                ['bash', '-c', 'tmux send-keys -t claude C-\['],
-                detach=False
+                ['bash', '-c', ' && '.join(steps)],
+                on_output=lambda text: self.store.add_output(self.agent_id, 'setup', text),
             )
+            reader.join()
+            if process.wait() != 0:
+                raise RuntimeError(f"setup command exited with status {process.returncode}")
         except Exception as e:
             raise RuntimeError(f"Failed to start Claude: {e}")
 
+    @staticmethod
+    def _wait_for_claude_script(timeout: float = 3.0) -> str:
+        """Shell snippet that returns once the claude pane shows any output.
+
+        Polls inside the container so readiness costs no docker round-trips,
+        backing off 10ms -> 100ms so a fast start is caught almost at once.
+        After `timeout` seconds it notes the slow start in the setup output
+        and carries on.
+        """
+        delays, total, delay = [], 0.0, 0.01
+        while total < timeout:
+            delays.append(delay)
+            total += delay
+            delay = min(delay * 2, 0.1)
+
+        return (
+            'pane_ready() { [ -n "$(tmux capture-pane -p -t claude | tr -d \'[:space:]\')" ]; } && '
+            f'for delay in {" ".join(f"{d:g}" for d in delays)}; do '
+            'pane_ready && break; sleep "$delay"; '
+            'done && '
+            f'{{ pane_ready || echo "Claude showed no output after {timeout:g}s; sending keys anyway"; }}'
+        )
+
+    def inspect(self) -> Optional[Dict]:
+        """Fetch the container's State block (None if it doesn't exist).
+
+        One inspect answers both "does it exist" and "is it running"; the
+        result is kept so attach_interactive() doesn't ask again.
+        """
+        self._state = docker_utils.get_container_state(self.container_id or self.container_name)
+        self._inspected = True
+        return self._state
+
     def attach_interactive(self):
         if not self.container_id:
-            if docker_utils.container_exists(self.container_name):
-                print(f"Attaching to container {self.container_name}...")
+            state = self._state if self._inspected else self.inspect()
+            if state is not None:
+                logger.info(f"Attaching to container {self.container_name}...")
             else:
                 raise RuntimeError(
                     f"No container found for agent {self.agent_id}. "
                     "The agent may have exited."
                 )
 
-        print(f"Attaching to agent {self.agent_id} in container...")
-        print("Press Ctrl+B then D to detach from the session.\n")
+        logger.info(f"Attaching to agent {self.agent_id} in container...")
+        logger.info("Press Ctrl+B then D to detach from the session.\n")
 
+        # Hands the terminal over to docker; does not return on success, so
+        # buffered output must be written first
+        self.store.flush()
         try:
             docker_utils.attach_to_claude_session(self.container_name)
         except RuntimeError as e:
             raise RuntimeError(f"Failed to attach to container: {e}")
-        except KeyboardInterrupt:
-            print("Detached from agent.")
 
     def stop(self):
+        # SIGTERM first so Claude can finish writing, SIGKILL after the timeout
         container_ref = self.container_id or self.container_name
         if container_ref:
-            docker_utils.stop_container(container_ref)
+            docker_utils.stop_container(container_ref, timeout=STOP_TIMEOUT)
 
     def remove(self, force: bool = True):
         container_ref = self.container_id or self.container_name
-        if container_ref:
-            docker_utils.remove_container(container_ref, force=force)
+        if not container_ref:
+            return
+        if force:
+            # Stopping an auto-removed container is enough to delete it
+            docker_utils.stop_and_remove(
+                container_ref, timeout=STOP_TIMEOUT, auto_remove=self.auto_remove
+            )
+        else:
+            docker_utils.remove_container(container_ref)
 
     def is_running(self) -> bool:
         container_ref = self.container_id or self.container_name
         if not container_ref:
             return False
 
-        info = docker_utils.get_container_info(container_ref)
-        return info.get('State', {}).get('Running', False) if info else False
+        state = docker_utils.get_container_state(container_ref)
+        return state.get('Running', False) if state else False
 
     def _load_env_vars(self) -> dict:
-        """Load environment variables from .env file and environment."""
-        # Load .env file from the project root (two levels up from this file)
-        project_root = Path(__file__).parent.parent
-        env_file = project_root / '.env'
+        """Load environment variables from .env file and environment.
+
+        The result is cached for the process until the .env file changes.
+        """
+        global _ENV_CACHE, _ENV_CACHE_MTIME
+        env_file = _ENV_FILE_PATH
+
+        try:
+            mtime = env_file.stat().st_mtime
+        except OSError:
+            mtime = None
+
+        if _ENV_CACHE is not None and mtime == _ENV_CACHE_MTIME:
+            return dict(_ENV_CACHE)
 
-        if env_file.exists():
+        if mtime is not None:
             try:
                 load_dotenv(env_file)
             except:
@@ -155,15 +297,16 @@ class ContainerAgentProcess:
         if api_key:
             env_vars['ANTHROPIC_API_KEY'] = api_key
         else:
-            print("Warning: ANTHROPIC_API_KEY not found in environment or .env file")
-            print(f"Please create a .env file at {env_file} with your API key")
+            logger.warning("ANTHROPIC_API_KEY not found in environment or .env file")
+            logger.warning(f"Please create a .env file at {env_file} with your API key")
 
         # Get GITHUB_PAT from environment
         github_pat = os.getenv('GITHUB_PAT')
         if github_pat:
             env_vars['GITHUB_PAT'] = github_pat
         else:
-            print("Warning: GITHUB_PAT not found in environment or .env file")
-            print(f"Please create a .env file at {env_file} with your GitHub PAT")
+            logger.warning("GITHUB_PAT not found in environment or .env file")
+            logger.warning(f"Please create a .env file at {env_file} with your GitHub PAT")
 
-        return env_vars
+        _ENV_CACHE, _ENV_CACHE_MTIME = env_vars, mtime
+        return dict(env_vars)
@@ -1,54 +1,526 @@
 """Docker container utilities for agent isolation."""
+import codecs
+import functools
+import hashlib
+import http.client
+import json
+import logging
+import os
+import re
+import socket
 import subprocess
 import shutil
-from typing import Optional, Dict, List
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Optional, Dict, List, Tuple
 from pathlib import Path
+from urllib.parse import quote, urlencode
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+IMAGE_HASH_FILE = Path.home() / ".fletcher" / "image.hash"
+PREPULL_MARKER = Path.home() / ".fletcher" / "prepulled"
+PREPULL_INTERVAL = 24 * 60 * 60
+DEFAULT_DOCKER_SOCKET = "/var/run/docker.sock"
+# How long a snapshot_containers() listing is reused
+CONTAINER_SNAPSHOT_TTL = 2.0
+# Older engines misbehave with more than ~10 concurrent container operations
+MAX_DOCKER_WORKERS = 10
+# Lines of build output kept for the error message when a build fails
+BUILD_LOG_TAIL = 200
+# Set on every image fletcher builds so pruning can skip everyone else's
+MANAGED_LABEL = "fletcher.managed=1"
+
+# Resolved once at import: the build context, and docker's absolute path so
+# each subprocess skips the PATH search. An absolute path plus
+# close_fds=False also lets the frequent CLI probes use posix_spawn instead
+# of fork/exec; our descriptors are non-inheritable (PEP 446), so leaving
+# them open in the child is safe.
+_DOCKERFILE_DIR = str(Path(__file__).resolve().parent.parent)
+_DOCKER_BIN = shutil.which('docker') or 'docker'
+
+# Scratch paths backed by tmpfs so ephemeral writes skip the overlay filesystem
+DEFAULT_TMPFS = {
+    '/tmp': 'rw,exec,size=256m',
+    '/run': 'rw,exec,size=64m',
+}
+
+logger = logging.getLogger(__name__)
+
+_BUILD_STEP = re.compile(r'#\d+ \[')
+
+# filter_name -> (taken_at, {container name: state})
+_snapshots: Dict[str, Tuple[float, Dict[str, str]]] = {}
+_snapshots_lock = threading.Lock()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, socket_path: str, timeout: float = 30):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+# How a keep-alive connection closed by the daemon shows up on next use
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+
+class DockerClient:
+    """Keep-alive connections to the Docker Engine API over its unix socket.
+
+    Reusing connections avoids forking the docker CLI (and re-dialing the
+    daemon) for every container probe. Each thread gets its own connection,
+    so slow calls like a container stop don't serialize parallel workers.
+    """
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self._local = threading.local()
+        self._conns: List[_UnixHTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def _connection(self) -> _UnixHTTPConnection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = _UnixHTTPConnection(self.socket_path)
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        timeout: float = 30,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Tuple[int, bytes]:
+        while True:
+            conn = self._connection()
+            conn.timeout = timeout
+            reused = conn.sock is not None
+            if reused:
+                conn.sock.settimeout(timeout)
+
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, OSError) as e:
+                self._discard(conn)
+                # Only a keep-alive connection the daemon closed while idle
+                # is retried: it never saw the request. Anything else, a
+                # timeout above all, may have been acted on already.
+                if not (reused and isinstance(e, _STALE_CONNECTION_ERRORS)):
+                    raise
+
+    def _discard(self, conn: _UnixHTTPConnection):
+        conn.close()
+        self._local.conn = None
+        with self._lock:
+            if conn in self._conns:
+                self._conns.remove(conn)
+
+    def close(self):
+        with self._lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+
+
+_client: Optional[DockerClient] = None
+_client_lock = threading.Lock()
+
+
+def _docker_socket_path() -> Optional[str]:
+    docker_host = os.environ.get('DOCKER_HOST')
+    if docker_host:
+        if not docker_host.startswith('unix://'):
+            return None
+        return docker_host[len('unix://'):]
+    return DEFAULT_DOCKER_SOCKET
+
+
+def get_client() -> Optional[DockerClient]:
+    """Return the shared API client, or None when only the CLI can be used."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            socket_path = _docker_socket_path()
+            if socket_path and os.path.exists(socket_path):
+                _client = DockerClient(socket_path)
+        return _client
+
+
+def _api(
+    method: str,
+    path: str,
+    timeout: float = 30,
+    body: Optional[bytes] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Optional[Tuple[int, bytes]]:
+    client = get_client()
+    if client is None:
+        return None
+    try:
+        return client.request(method, path, timeout=timeout, body=body, headers=headers)
+    except (http.client.HTTPException, OSError):
+        return None
 
 
+def _api_json(method: str, path: str, payload: dict, timeout: float = 30) -> Optional[Tuple[int, bytes]]:
+    return _api(method, path, timeout=timeout, body=json.dumps(payload).encode(),
+                headers={'Content-Type': 'application/json'})
+
+
+def _api_error(body: bytes) -> str:
+    try:
+        return json.loads(body)['message']
+    except (ValueError, KeyError, TypeError):
+        return body.decode(errors='replace')
+
+
+@functools.lru_cache(maxsize=None)
 def check_docker_available() -> bool:
     return shutil.which('docker') is not None
 
 
-def check_docker_running() -> bool:
+def ping_socket(timeout: float = 0.5) -> Optional[bool]:
+    """Answer "is the daemon up" with one raw /_ping on the unix socket.
+
+    Returns None when there is no local socket to ask (remote DOCKER_HOST,
+    missing or unreadable socket), so callers can fall back to the CLI.
+    """
+    socket_path = _docker_socket_path()
+    if socket_path is None:
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
     try:
-        result = subprocess.run(
-            ['docker', 'info'],
-            capture_output=True,
-            check=False,
-            timeout=5
-        )
-        return result.returncode == 0
-    except Exception:
+        sock.connect(socket_path)
+        sock.sendall(b'GET /_ping HTTP/1.0\r\nHost: docker\r\n\r\n')
+        status_line = sock.recv(64).split(b'\r\n', 1)[0]
+        return status_line.split(b' ')[1:2] == [b'200']
+    except (FileNotFoundError, PermissionError):
+        return None
+    except OSError:
+        # The socket exists but nothing answers: the daemon is down
         return False
+    finally:
+        sock.close()
 
 
-def build_agent_image(image_name: str = "claude-agent:latest") -> bool:
+def _build_context_files(context_dir: Path) -> List[Path]:
+    """Return the Dockerfile plus every file it COPYs/ADDs from the context."""
+    dockerfile = context_dir / 'Dockerfile'
+    files = [dockerfile]
+
+    for line in dockerfile.read_text().splitlines():
+        parts = line.split()
+        if not parts or parts[0].upper() not in ('COPY', 'ADD'):
+            continue
+        sources = [p for p in parts[1:-1] if not p.startswith('--')]
+        for source in sources:
+            for path in sorted(context_dir.glob(source)):
+                if path.is_dir():
+                    files.extend(sorted(p for p in path.rglob('*') if p.is_file()))
+                else:
+                    files.append(path)
+
+    return files
+
+
+def compute_build_hash() -> str:
+    """Hash the image build inputs so unchanged images are never rebuilt."""
+    context_dir = Path(_DOCKERFILE_DIR)
+    digest = hashlib.sha256()
+
+    for path in _build_context_files(context_dir):
+        digest.update(str(path.relative_to(context_dir)).encode())
+        digest.update(b'\0')
+        digest.update(path.read_bytes())
+
+    return digest.hexdigest()
+
+
+def _read_image_hash() -> Optional[str]:
     try:
-        dockerfile_dir = Path(__file__).parent.parent
+        return IMAGE_HASH_FILE.read_text().strip()
+    except OSError:
+        return None
 
-        result = subprocess.run(
-            ['docker', 'build', '-t', image_name, str(dockerfile_dir)],
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"Failed to build Docker image: {e.stderr}")
+
+def _write_image_hash(build_hash: str):
+    IMAGE_HASH_FILE.parent.mkdir(parents=True, exist_ok=True)
+    IMAGE_HASH_FILE.write_text(build_hash)
+
+
+def invalidate_image_cache():
+    """Forget that the agent image was built, forcing the next check to rebuild."""
+    try:
+        IMAGE_HASH_FILE.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def image_up_to_date(image_name: str = "claude-agent:latest") -> bool:
+    """Check the image was built from the current build context.
+
+    The hash file is only written after a successful build and is cleared
+    when a prune deletes the image, so a matching hash skips the Docker
+    probe. Callers should invalidate_image_cache() if the image has gone
+    missing anyway.
+    """
+    return _read_image_hash() == compute_build_hash()
+
+
+def base_image() -> Optional[str]:
+    """Return the image named in the Dockerfile's first FROM line."""
+    dockerfile = Path(_DOCKERFILE_DIR) / 'Dockerfile'
+    for line in dockerfile.read_text().splitlines():
+        parts = line.split()
+        if parts and parts[0].upper() == 'FROM':
+            images = [p for p in parts[1:] if not p.startswith('--')]
+            return images[0] if images else None
+    return None
+
+
+def prepull_base_image() -> bool:
+    image = base_image()
+    if not image:
+        return False
+
+    try:
+        result = subprocess.run([_DOCKER_BIN, 'pull', image], stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL, check=False)
+    except OSError:
+        return False
+    if result.returncode != 0:
         return False
 
+    PREPULL_MARKER.parent.mkdir(parents=True, exist_ok=True)
+    PREPULL_MARKER.touch()
+    return True
+
+
+_prepull_thread: Optional[threading.Thread] = None
+
+
+def start_prepull() -> bool:
+    """Pull the base image in the background if a build is coming.
+
+    Runs at most once a day, and only when the agent image is stale.
+    """
+    global _prepull_thread
 
-def image_exists(image_name: str = "claude-agent:latest") -> bool:
     try:
-        result = subprocess.run(
-            ['docker', 'image', 'inspect', image_name],
-            capture_output=True,
-            check=False
+        if time.time() - PREPULL_MARKER.stat().st_mtime < PREPULL_INTERVAL:
+            return False
+    except OSError:
+        pass
+
+    if image_up_to_date():
+        return False
+
+    _prepull_thread = threading.Thread(target=prepull_base_image, daemon=True)
+    _prepull_thread.start()
+    return True
+
+
+def wait_for_prepull():
+    if _prepull_thread is not None:
+        _prepull_thread.join()
+
+
+# Set once a background prewarm build has finished, successfully or not
+_prewarm_done = threading.Event()
+_prewarm_thread: Optional[threading.Thread] = None
+
+
+def _prewarm_build():
+    try:
+        wait_for_prepull()
+        build_agent_image()
+    finally:
+        _prewarm_done.set()
+
+
+def prewarm_image() -> bool:
+    """Start building a stale agent image in the background.
+
+    Moves the build off the spawn critical path; spawn only blocks on it
+    (via wait_for_prewarm) if it is still running when a container is needed.
+    """
+    global _prewarm_thread
+
+    if _prewarm_thread is not None or not check_docker_available() or image_up_to_date():
+        return False
+
+    _prewarm_thread = threading.Thread(target=_prewarm_build, daemon=True)
+    _prewarm_thread.start()
+    return True
+
+
+def wait_for_prewarm():
+    if _prewarm_thread is not None:
+        _prewarm_done.wait()
+
+
+def build_agent_image(image_name: str = "claude-agent:latest") -> bool:
+    build_hash = compute_build_hash()
+
+    # Stream the log rather than buffering it; only the tail is kept for errors
+    tail: Deque[str] = deque(maxlen=BUILD_LOG_TAIL)
+    try:
+        # BuildKit reuses cached layers for unchanged Dockerfile steps. The
+        # inline cache metadata lets the previous image seed that cache even
+        # after the builder's own cache has been pruned.
+        process = subprocess.Popen(
+            [
+                _DOCKER_BIN, 'build', '--progress=plain',
+                '--build-arg', 'BUILDKIT_INLINE_CACHE=1',
+                '--cache-from', image_name,
+                '--label', MANAGED_LABEL,
+                '-t', image_name, _DOCKERFILE_DIR,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            env={**os.environ, 'DOCKER_BUILDKIT': '1'},
         )
-        return result.returncode == 0
-    except Exception:
+    except OSError as e:
+        logger.error(f"Failed to build Docker image: {e}")
         return False
 
+    with process.stdout:
+        for line in process.stdout:
+            line = line.rstrip('\n')
+            tail.append(line)
+            # Step headers ("#5 [2/8] RUN ...") as progress, the rest on demand
+            logger.log(logging.INFO if _BUILD_STEP.match(line) else logging.DEBUG, line)
+
+    if process.wait() != 0:
+        logger.error("Failed to build Docker image:\n" + '\n'.join(tail))
+        return False
+
+    _write_image_hash(build_hash)
+    return True
+
+
+def _run_command(
+    container_name: str,
+    working_dir: str,
+    image_name: str,
+    network_mode: str,
+    auto_remove: bool,
+    additional_args: Optional[List[str]],
+    env_vars: Optional[Dict[str, str]],
+    mount_point: str,
+    labels: Optional[Dict[str, str]],
+    tmpfs: Optional[Dict[str, str]],
+) -> List[str]:
+    cmd = [
+        _DOCKER_BIN, 'run',
+        '-d',
+        '--name', container_name,
+        '--network', network_mode,
+        '-v', f'{working_dir}:{mount_point}',
+        '-w', mount_point,
+        '--init',
+    ]
+
+    if auto_remove:
+        cmd.append('--rm')
+
+    if env_vars:
+        for key, value in env_vars.items():
+            cmd.extend(['-e', f'{key}={value}'])
+
+    if labels:
+        for key, value in labels.items():
+            cmd.extend(['--label', f'{key}={value}'])
+
+    if tmpfs:
+        for path, options in tmpfs.items():
+            cmd.extend(['--tmpfs', f'{path}:{options}' if options else path])
+
+    cmd.extend([
+        '--memory', '2g',
+        '--cpus', '2',
+        '--pids-limit', '100',
+    ])
+
+    if additional_args:
+        cmd.extend(additional_args)
+
+    cmd.extend([
+        image_name,
+        'sleep', 'infinity'
+    ])
+    return cmd
+
+
+def _create_container_api(
+    container_name: str,
+    working_dir: str,
+    image_name: str,
+    network_mode: str,
+    auto_remove: bool,
+    env_vars: Optional[Dict[str, str]],
+    mount_point: str,
+    labels: Optional[Dict[str, str]],
+    tmpfs: Optional[Dict[str, str]],
+) -> Optional[str]:
+    """Create and start a container over the API, mirroring _run_command."""
+    config = {
+        'Image': image_name,
+        'Cmd': ['sleep', 'infinity'],
+        'WorkingDir': mount_point,
+        'Env': [f'{key}={value}' for key, value in (env_vars or {}).items()],
+        'Labels': labels or {},
+        'HostConfig': {
+            'Binds': [f'{working_dir}:{mount_point}'],
+            'NetworkMode': network_mode,
+            'Init': True,
+            'AutoRemove': auto_remove,
+            'Tmpfs': tmpfs or {},
+            'Memory': 2 * 1024 ** 3,
+            'NanoCpus': 2 * 10 ** 9,
+            'PidsLimit': 100,
+        },
+    }
+
+    response = _api_json('POST', f'/containers/create?{urlencode({"name": container_name})}', config)
+    if response is None:
+        return None
+    status, body = response
+    if status != 201:
+        raise RuntimeError(f"Failed to create container: {_api_error(body)}")
+
+    container_id = json.loads(body)['Id']
+    response = _api('POST', f'/containers/{container_id}/start')
+    if response is None or response[0] not in (204, 304):
+        _api('DELETE', f'/containers/{container_id}?force=1')
+        reason = _api_error(response[1]) if response else "lost connection to Docker"
+        raise RuntimeError(f"Failed to start container: {reason}")
+
+    return container_id
+
 
 def create_container(
     container_name: str,
@@ -58,38 +530,24 @@ def create_container(
     auto_remove: bool = True,
     additional_args: Optional[List[str]] = None,
     env_vars: Optional[Dict[str, str]] = None,
+    mount_point: str = "/workspace",
+    labels: Optional[Dict[str, str]] = None,
+    tmpfs: Optional[Dict[str, str]] = None,
 ) -> str:
     try:
-        cmd = [
-            'docker', 'run',
-            '-d',
-            '--name', container_name,
-            '--network', network_mode,
-            '-v', f'{working_dir}:/workspace',
-            '-w', '/workspace',
-            '--init',
-        ]
-
-        if auto_remove:
-            cmd.append('--rm')
-
-        if env_vars:
-            for key, value in env_vars.items():
-                cmd.extend(['-e', f'{key}={value}'])
-
-        cmd.extend([
-            '--memory', '2g',
-            '--cpus', '2',
-            '--pids-limit', '100',
-        ])
-
-        if additional_args:
-            cmd.extend(additional_args)
-
-        cmd.extend([
-            image_name,
-            'sleep', 'infinity'
-        ])
+        # Extra raw CLI flags can't be translated to the API, so they force the CLI
+        if not additional_args:
+            container_id = _create_container_api(
+                container_name, working_dir, image_name, network_mode,
+                auto_remove, env_vars, mount_point, labels, tmpfs,
+            )
+            if container_id is not None:
+                return container_id
+
+        cmd = _run_command(
+            container_name, working_dir, image_name, network_mode,
+            auto_remove, additional_args, env_vars, mount_point, labels, tmpfs,
+        )
 
         result = subprocess.run(
             cmd,
@@ -103,45 +561,108 @@ def create_container(
 
     except subprocess.CalledProcessError as e:
         raise RuntimeError(f"Failed to create container: {e.stderr}")
+    finally:
+        # A snapshot taken before the container started would call it dead
+        invalidate_container_snapshot()
 
 
-def exec_in_container(
-    container_id: str,
-    command: List[str],
-    detach: bool = False,
-    interactive: bool = False
-) -> subprocess.CompletedProcess:
+def create_container_background(
+    container_name: str,
+    working_dir: str,
+    image_name: str = "claude-agent:latest",
+    network_mode: str = "none",
+    auto_remove: bool = True,
+    additional_args: Optional[List[str]] = None,
+    env_vars: Optional[Dict[str, str]] = None,
+    mount_point: str = "/workspace",
+    labels: Optional[Dict[str, str]] = None,
+    tmpfs: Optional[Dict[str, str]] = None,
+) -> subprocess.Popen:
+    """Start `docker run` without waiting; it finishes even if we exit first."""
+    cmd = _run_command(
+        container_name, working_dir, image_name, network_mode,
+        auto_remove, additional_args, env_vars, mount_point, labels, tmpfs,
+    )
+    return subprocess.Popen(
+        cmd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def rename_container(container_ref: str, new_name: str) -> bool:
     try:
-        cmd = ['docker', 'exec']
+        return _rename_container(container_ref, new_name)
+    finally:
+        invalidate_container_snapshot()
 
-        if detach:
-            cmd.append('-d')
 
-        if interactive:
-            cmd.extend(['-it'])
+def _rename_container(container_ref: str, new_name: str) -> bool:
+    response = _api('POST', f'/containers/{quote(container_ref)}/rename?{urlencode({"name": new_name})}')
+    if response is not None:
+        return response[0] == 204
 
-        cmd.append(container_id)
-        cmd.extend(command)
-
-        result = subprocess.run(
-            cmd,
+    try:
+        subprocess.run(
+            [_DOCKER_BIN, 'rename', container_ref, new_name],
             check=True,
-            capture_output=not interactive,
-            text=True
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
         )
+        return True
+    except subprocess.CalledProcessError:
+        return False
 
-        return result
 
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"Failed to execute command in container: {e}")
+def exec_in_container_streaming(
+    container_id: str,
+    command: List[str],
+    on_output: Callable[[str], None],
+    chunk_size: int = 4096,
+) -> Tuple[subprocess.Popen, threading.Thread]:
+    """Run a command in the container, passing output to `on_output` as it arrives.
+
+    Output is read in `chunk_size` pieces on a background thread instead of
+    being buffered until exit. Join the returned thread, then wait on the
+    process for its exit status.
+    """
+    process = subprocess.Popen(
+        [_DOCKER_BIN, 'exec', container_id, *command],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        bufsize=0,
+        close_fds=True,
+    )
+
+    def pump():
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        with process.stdout:
+            for chunk in iter(lambda: process.stdout.read(chunk_size), b''):
+                text = decoder.decode(chunk)
+                if text:
+                    on_output(text)
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            on_output(tail)
+
+    reader = threading.Thread(target=pump, daemon=True)
+    reader.start()
+    return process, reader
 
 
 def stop_container(container_id: str, timeout: int = 10) -> bool:
+    response = _api('POST', f'/containers/{quote(container_id)}/stop?t={timeout}',
+                    timeout=timeout + 30)
+    if response is not None:
+        return response[0] in (204, 304)
+
     try:
         subprocess.run(
-            ['docker', 'stop', '-t', str(timeout), container_id],
+            [_DOCKER_BIN, 'stop', '-t', str(timeout), container_id],
             check=True,
-            capture_output=True
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
         )
         return True
     except subprocess.CalledProcessError:
@@ -149,8 +670,16 @@ def stop_container(container_id: str, timeout: int = 10) -> bool:
 
 
 def remove_container(container_id: str, force: bool = False) -> bool:
+    """Remove a container; one that doesn't exist counts as removed.
+
+    This lets callers remove optimistically instead of probing first.
+    """
+    response = _api('DELETE', f'/containers/{quote(container_id)}?force={int(force)}')
+    if response is not None:
+        return response[0] in (204, 404)
+
     try:
-        cmd = ['docker', 'rm']
+        cmd = [_DOCKER_BIN, 'rm']
         if force:
             cmd.append('-f')
         cmd.append(container_id)
@@ -158,111 +687,210 @@ def remove_container(container_id: str, force: bool = False) -> bool:
         subprocess.run(
             cmd,
             check=True,
-            capture_output=True
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE
         )
         return True
-    except subprocess.CalledProcessError:
-        return False
-
-
-def get_container_info(container_id: str) -> Optional[Dict]:
-    try:
-        import json
-
-        result = subprocess.run(
-            ['docker', 'inspect', container_id],
-            check=True,
-            capture_output=True,
-            text=True
-        )
+    except subprocess.CalledProcessError as e:
+        return b'No such container' in (e.stderr or b'')
 
-        info = json.loads(result.stdout)
-        return info[0] if info else None
 
-    except (subprocess.CalledProcessError, json.JSONDecodeError, IndexError):
-        return None
+def stop_and_remove(container_id: str, timeout: int = 10, auto_remove: bool = False) -> bool:
+    """Gracefully stop a container and make sure it is gone.
 
+    Containers started with auto_remove are deleted by the daemon once they
+    stop, so the separate `docker rm` is only issued when that didn't happen.
+    """
+    if stop_container(container_id, timeout=timeout) and auto_remove:
+        return True
+    return remove_container(container_id, force=True)
+
+
+def _bulk(action: Callable[[str], bool], container_refs: List[str], workers: int) -> Dict[str, bool]:
+    if not container_refs:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(workers, len(container_refs))) as executor:
+        return dict(zip(container_refs, executor.map(action, container_refs)))
+
+
+def bulk_remove(
+    container_refs: List[str],
+    force: bool = True,
+    workers: int = MAX_DOCKER_WORKERS,
+) -> Dict[str, bool]:
+    """Remove containers; maps each ref to whether it was removed.
+
+    Over the API the deletes run concurrently; through the CLI every ref
+    goes to a single `docker rm`. As with remove_container(), a container
+    that doesn't exist counts as removed.
+    """
+    if not container_refs or get_client() is not None:
+        return _bulk(lambda ref: remove_container(ref, force=force), container_refs, workers)
+
+    cmd = [_DOCKER_BIN, 'rm']
+    if force:
+        cmd.append('-f')
+    cmd.extend(container_refs)
+    result = subprocess.run(cmd, capture_output=True, text=True, check=False)
+
+    # `docker rm` echoes each removed ref and reports the rest on stderr
+    removed = set(result.stdout.split())
+    return {
+        ref: ref in removed or f'No such container: {ref}' in result.stderr
+        for ref in container_refs
+    }
+
+
+def get_container_state(container_id: str) -> Optional[Dict]:
+    """Return just the container's State block, or None if it doesn't exist.
+
+    Only the CLI fallback is cheaper than a full inspect: it formats the
+    ~100-byte State object instead of the whole document. The Engine API
+    has no partial inspect, so over the socket the full document is still
+    transferred and decoded.
+    """
+    response = _api('GET', f'/containers/{quote(container_id)}/json')
+    if response is not None:
+        status, body = response
+        return _json_loads(body).get('State', {}) if status == 200 else None
 
-def container_exists(container_name: str) -> bool:
     try:
         result = subprocess.run(
-            ['docker', 'ps', '-a', '--filter', f'name={container_name}', '--format', '{{.Names}}'],
+            [_DOCKER_BIN, 'inspect', '--format', '{{json .State}}', container_id],
             check=True,
             capture_output=True,
-            text=True
+            close_fds=False
         )
-        return container_name in result.stdout.strip().split('\n')
-    except subprocess.CalledProcessError:
-        return False
-
+        return _json_loads(result.stdout)
 
-def attach_to_container(container_id: str):
-    try:
-        subprocess.run(
-            ['docker', 'exec', '-it', container_id, '/bin/bash'],
-            check=True
-        )
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"Failed to attach to container: {e}")
+    except (subprocess.CalledProcessError, json.JSONDecodeError):
+        return None
 
 
 def attach_to_claude_session(container_id: str):
-    """Attach to the Claude tmux session running in the container."""
-    try:
-        subprocess.run(
-            ['docker', 'exec', '-it', container_id, 'tmux', 'attach', '-t', 'claude'],
-            check=True
-        )
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"Failed to attach to Claude session: {e}")
+    """Attach to the Claude tmux session running in the container.
 
-
-def remove_image(image_name: str, force: bool = False) -> bool:
+    Replaces the current process with `docker exec`, so this only returns if
+    the exec itself fails.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
     try:
-        cmd = ['docker', 'rmi']
-        if force:
-            cmd.append('-f')
-        cmd.append(image_name)
+        os.execvp(_DOCKER_BIN, ['docker', 'exec', '-it', container_id, 'tmux', 'attach', '-t', 'claude'])
+    except OSError as e:
+        raise RuntimeError(f"Failed to attach to Claude session: {e}")
 
-        subprocess.run(
-            cmd,
-            check=True,
-            capture_output=True
-        )
-        return True
-    except subprocess.CalledProcessError:
-        return False
 
+def prune_images(all_images: bool = False, image_name: str = "claude-agent:latest") -> bool:
+    """Prune images fletcher built; other images on the host are left alone.
 
-def prune_images(all_images: bool = False) -> bool:
+    The image cache is only invalidated when the prune removed `image_name`
+    itself, so pruning dangling layers doesn't force a rebuild.
+    """
     try:
-        cmd = ['docker', 'image', 'prune', '-f']
+        cmd = [_DOCKER_BIN, 'image', 'prune', '-f', '--filter', f'label={MANAGED_LABEL}']
         if all_images:
             cmd.append('-a')
 
-        subprocess.run(
+        result = subprocess.run(
             cmd,
             check=True,
-            capture_output=True
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True
         )
+        if f"untagged: {image_name}" in result.stdout.splitlines():
+            invalidate_image_cache()
         return True
     except subprocess.CalledProcessError:
         return False
 
 
-def list_containers(all_containers: bool = True, filter_name: Optional[str] = None) -> List[str]:
+def snapshot_containers(filter_name: str = 'agent-') -> Dict[str, str]:
+    """Map every container whose name matches `filter_name` to its state.
+
+    One listing answers "is it running" for many containers. The result is
+    reused for CONTAINER_SNAPSHOT_TTL, so a burst of status checks shares
+    it; creating or renaming a container drops it.
+    """
+    now = time.monotonic()
+    with _snapshots_lock:
+        cached = _snapshots.get(filter_name)
+    if cached is not None and now - cached[0] < CONTAINER_SNAPSHOT_TTL:
+        return cached[1]
+
+    states: Dict[str, str] = {}
+    query = urlencode({'all': 1, 'filters': json.dumps({'name': [filter_name]})})
+    response = _api('GET', f'/containers/json?{query}')
+    if response is not None:
+        status, body = response
+        if status == 200:
+            states = {c['Names'][0].lstrip('/'): c.get('State', '')
+                      for c in _json_loads(body) if c.get('Names')}
+    else:
+        result = subprocess.run(
+            [_DOCKER_BIN, 'ps', '-a', '--filter', f'name={filter_name}',
+             '--format', '{{.Names}}\t{{.State}}'],
+            capture_output=True,
+            text=True,
+            check=False,
+            close_fds=False
+        )
+        for line in result.stdout.splitlines():
+            name, _, state = line.partition('\t')
+            if name:
+                states[name] = state
+
+    with _snapshots_lock:
+        _snapshots[filter_name] = (now, states)
+    return states
+
+
+def invalidate_container_snapshot():
+    with _snapshots_lock:
+        _snapshots.clear()
+
+
+def list_containers(
+    all_containers: bool = True,
+    filter_name: Optional[str] = None,
+    filter_labels: Optional[Dict[str, str]] = None,
+    filter_status: Optional[str] = None,
+) -> List[str]:
+    filters = {}
+    if filter_name:
+        filters['name'] = [filter_name]
+    if filter_status:
+        filters['status'] = [filter_status]
+    if filter_labels:
+        filters['label'] = [f'{key}={value}' for key, value in filter_labels.items()]
+    query = urlencode({'all': int(all_containers), 'filters': json.dumps(filters)})
+
+    response = _api('GET', f'/containers/json?{query}')
+    if response is not None:
+        status, body = response
+        if status != 200:
+            return []
+        return [c['Names'][0].lstrip('/') for c in _json_loads(body) if c.get('Names')]
+
     try:
-        cmd = ['docker', 'ps', '--format', '{{.Names}}']
+        cmd = [_DOCKER_BIN, 'ps', '--format', '{{.Names}}']
         if all_containers:
             cmd.append('-a')
         if filter_name:
             cmd.extend(['--filter', f'name={filter_name}'])
+        if filter_status:
+            cmd.extend(['--filter', f'status={filter_status}'])
+        if filter_labels:
+            for key, value in filter_labels.items():
+                cmd.extend(['--filter', f'label={key}={value}'])
 
         result = subprocess.run(
             cmd,
             check=True,
             capture_output=True,
-            text=True
+            text=True,
+            close_fds=False
         )
         containers = result.stdout.strip().split('\n')
         return [c for c in containers if c]
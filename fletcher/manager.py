@@ -1,12 +1,24 @@
 """Agent lifecycle management."""
-import shutil
-from typing import Optional, Dict
-from pathlib import Path
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Dict, List, Sequence, Tuple
 
 from .store import AgentStore
 from .container_process import ContainerAgentProcess
+from . import status_watcher
+from .status_watcher import StatusWatcher
 from . import utils
 from . import docker_utils
+from . import tmux_utils
+
+# Beyond this many concurrent creates the Docker daemon's tail latency grows
+MAX_PARALLEL_SPAWNS = 8
+
+DASHBOARD_SESSION = "fletcher"
+
+logger = logging.getLogger(__name__)
 
 
 class AgentManager:
@@ -14,32 +26,81 @@ class AgentManager:
     def __init__(self, store: Optional[AgentStore] = None):
         self.store = store or AgentStore()
         self.active_processes: Dict[str, ContainerAgentProcess] = {}
+        # Background container preparation that overlaps with cloning; one
+        # worker per concurrent spawn so parallel prepares don't queue
+        self._pool = ThreadPoolExecutor(max_workers=MAX_PARALLEL_SPAWNS)
+        self._watcher: Optional[StatusWatcher] = None
+
+    def watch_status(self):
+        """Track container exits from `docker events` instead of polling.
+
+        Meant for long-lived processes; while the watcher is healthy,
+        listings trust the store instead of querying Docker.
+        """
+        if self._watcher is None:
+            self._watcher = StatusWatcher(self.store)
+        self._watcher.start()
+        # Catch up on exits that happened before the subscription began
+        self._sync_agent_statuses(self.store.list_agents(status='running'), force=True)
+
+    def run_status_daemon(self, stop: Optional[threading.Event] = None):
+        """Keep the store current from Docker events until `stop` is set.
+
+        Heartbeats so other fl processes skip their own container listing,
+        restarts the subscription if it dies, and still re-lists containers
+        every RESYNC_INTERVAL in case an event was missed.
+        """
+        stop = stop or threading.Event()
+        self.watch_status()
+        last_sync = time.monotonic()
+        try:
+            self._watcher.beat()
+            while not stop.wait(status_watcher.HEARTBEAT_INTERVAL):
+                if not self._watcher.healthy:
+                    logger.warning("Docker events subscription ended; restarting it")
+                    self.watch_status()
+                    last_sync = time.monotonic()
+                elif time.monotonic() - last_sync >= status_watcher.RESYNC_INTERVAL:
+                    self._sync_agent_statuses(self.store.list_agents(status='running'), force=True)
+                    last_sync = time.monotonic()
+                self._watcher.beat()
+        finally:
+            self._watcher.stop()
 
     def spawn_agent(
         self,
         repo_url: str,
+        depth: Optional[int] = 1,
     ) -> str:
         agent_id = utils.generate_agent_id()
 
         working_dir = utils.get_agent_working_dir(agent_id)
         working_dir.mkdir(parents=True, exist_ok=True)
 
+        process = ContainerAgentProcess(agent_id, str(working_dir), self.store)
+        prepared = None
+
+        # Written before any work starts, so other `fl` processes see the
+        # spawn and `fl clean` can find whatever a killed spawn left behind
+        self.store.create_agent(
+            agent_id=agent_id,
+            repo_url=repo_url,
+            working_dir=str(working_dir),
+            status="spawning"
+        )
+
         try:
-            self.store.create_agent(
-                agent_id=agent_id,
-                repo_url=repo_url,
-                working_dir=str(working_dir),
-                status="spawning"
-            )
+            # Build the image and start the container while the clone runs
+            prepared = self._pool.submit(process.prepare)
 
-            print(f"Cloning repository to {working_dir}...")
-            utils.clone_repository(repo_url, str(working_dir))
+            logger.info(f"Cloning repository to {working_dir}...")
+            utils.clone_repository(repo_url, str(working_dir), depth=depth)
 
             branch_name = f"fletcher/{agent_id}"
-            print(f"Creating branch: {branch_name}")
+            logger.info(f"Creating branch: {branch_name}")
             utils.create_and_checkout_branch(str(working_dir), branch_name)
 
-            process = ContainerAgentProcess(agent_id, str(working_dir), self.store)
+            prepared.result()
             container_id = process.spawn_interactive()
             self.store.update_agent(agent_id, pid=container_id, status="running")
 
@@ -47,20 +108,90 @@ class AgentManager:
 
             return agent_id
 
-        except Exception as e:
+        except BaseException as e:
+            # Ctrl-C lands here too, so an interrupted spawn leaves no
+            # container or clone behind
+            self._discard_spawn(process, prepared, working_dir)
+            if not isinstance(e, Exception):
+                raise
+
+            # Keep a record of the failure for `fl list`
             self.store.update_agent(agent_id, status="error")
-            if working_dir.exists():
-                shutil.rmtree(working_dir)
             raise RuntimeError(f"Failed to spawn agent: {e}")
 
+    @staticmethod
+    def _discard_spawn(process: ContainerAgentProcess, prepared: Optional[Future], working_dir):
+        """Remove a failed spawn's container and working directory.
+
+        Doesn't wait for a prepare() that is still building the image; the
+        cleanup runs once it finishes. The workdir goes after the container,
+        since starting one would recreate its bind mount (owned by root).
+        """
+        def discard(future: Optional[Future] = None):
+            if (future is not None and not future.cancelled()
+                    and future.exception() is None and process.container_id):
+                docker_utils.remove_container(process.container_id, force=True)
+            utils.fast_rmtree(working_dir)
+
+        if prepared is None or prepared.cancel():
+            discard()
+        else:
+            prepared.add_done_callback(discard)
+
+    def close(self):
+        """Stop the status watcher and background prepares, and close the store.
+
+        A prepare already building the image isn't waited for; it cleans up
+        after itself through _discard_spawn.
+        """
+        if self._watcher is not None:
+            self._watcher.stop()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self.store.close()
+
+    def spawn_agents(
+        self,
+        repo_urls: Sequence[str],
+        depth: Optional[int] = 1,
+    ) -> List[Tuple[str, Optional[str], Optional[Exception]]]:
+        """Spawn one agent per repository concurrently.
+
+        Returns (repo_url, agent_id, error) for each URL, in input order.
+        """
+        def spawn_one(repo_url: str):
+            try:
+                return repo_url, self.spawn_agent(repo_url, depth=depth), None
+            except Exception as e:
+                return repo_url, None, e
+
+        workers = min(MAX_PARALLEL_SPAWNS, len(repo_urls))
+        executor = ThreadPoolExecutor(max_workers=workers)
+        futures = [executor.submit(spawn_one, repo_url) for repo_url in repo_urls]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            # Interrupted (Ctrl-C reaches only this thread): drop spawns that
+            # haven't started and tear down the others once they finish
+            for future in futures:
+                future.cancel()
+            for future in futures:
+                if not future.cancelled() and future.exception() is None:
+                    _, agent_id, _ = future.result()
+                    if agent_id:
+                        self.delete_agent(agent_id)
+            raise
+        finally:
+            executor.shutdown(wait=False)
+
     def attach_agent(self, agent_id: str):
         agent = self.store.get_agent(agent_id)
         if not agent:
             raise ValueError(f"Agent not found: {agent_id}")
 
         process = ContainerAgentProcess(agent_id, agent['working_dir'], self.store)
+        state = process.inspect()
 
-        if not docker_utils.container_exists(f"agent-{agent_id}"):
+        if state is None:
             if agent['status'] == 'running':
                 self.store.update_agent(agent_id, status='stopped')
             raise RuntimeError(
@@ -68,7 +199,7 @@ class AgentManager:
                 "The agent may have exited."
             )
 
-        if not process.is_running():
+        if not state.get('Running', False):
             if agent['status'] == 'running':
                 self.store.update_agent(agent_id, status='stopped')
             raise RuntimeError(
@@ -76,17 +207,41 @@ class AgentManager:
                 "The agent may have exited."
             )
 
-        agent = self.store.get_agent(agent_id)
-        process = ContainerAgentProcess(agent_id, agent['working_dir'], self.store)
         process.attach_interactive()
 
-    def list_agents(self, status: Optional[str] = None) -> list[Dict]:
-        agents = self.store.list_agents(status=status)
+    def attach_all_agents(self):
+        """Open a tiled tmux dashboard with one pane per running agent."""
+        if not tmux_utils.is_available():
+            raise RuntimeError("tmux not found. Please install tmux to attach to all agents.")
 
-        for agent in agents:
-            self._sync_agent_status(agent)
+        agents = self._sync_agent_statuses(self.store.list_agents(status='running'))
+        agents = [agent for agent in agents if agent['status'] == 'running']
 
-        return agents
+        if not agents:
+            raise RuntimeError("No running agents to attach to.")
+
+        # Build the whole dashboard in one tmux client, commands split by ';'
+        commands: List[List[str]] = []
+        if DASHBOARD_SESSION in tmux_utils.list_sessions():
+            commands.append(['kill-session', '-t', DASHBOARD_SESSION])
+
+        first, *rest = agents
+        commands.append(['new-session', '-d', '-s', DASHBOARD_SESSION,
+                         self._attach_command(first['id'])])
+        for agent in rest:
+            # Re-tile after every split so later splits still have room
+            commands.append(['split-window', '-t', DASHBOARD_SESSION,
+                             self._attach_command(agent['id'])])
+            commands.append(['select-layout', '-t', DASHBOARD_SESSION, 'tiled'])
+
+        tmux_utils.run_commands(commands)
+
+        tmux_utils.attach_session(DASHBOARD_SESSION)
+
+    def list_agents(self, status: Optional[str] = None) -> list[Dict]:
+        if status == 'running':
+            return self._running_agents()
+        return self._sync_agent_statuses(self.store.list_agents(status=status))
 
     def get_agent(self, agent_id: str) -> Optional[Dict]:
         agent = self.store.get_agent(agent_id)
@@ -101,18 +256,18 @@ class AgentManager:
         if not agent:
             raise ValueError(f"Agent not found: {agent_id}")
 
-        container_name = f"agent-{agent_id}"
-        if docker_utils.container_exists(container_name):
-            print(f"Stopping container {container_name}...")
-            docker_utils.stop_container(container_name)
+        container_name = utils.container_name(agent_id)
+        logger.info(f"Stopping container {container_name}...")
+        if remove_workdir:
+            # The work is being discarded, so skip the graceful shutdown
             docker_utils.remove_container(container_name, force=True)
+        else:
+            docker_utils.stop_and_remove(container_name, auto_remove=True)
 
         self.active_processes.pop(agent_id, None)
 
         if remove_workdir:
-            working_dir = Path(agent['working_dir'])
-            if working_dir.exists():
-                shutil.rmtree(working_dir)
+            utils.discard_tree(agent['working_dir'])
 
             self.store.delete_agent(agent_id)
         else:
@@ -125,40 +280,106 @@ class AgentManager:
         if not agent:
             raise ValueError(f"Agent not found: {agent_id}")
 
-        container_name = f"agent-{agent_id}"
-        if docker_utils.container_exists(container_name):
-            docker_utils.stop_container(container_name)
-            docker_utils.remove_container(container_name, force=True)
+        # rm -f kills and removes in one call; nothing needs a graceful stop
+        # since the working directory goes too
+        docker_utils.remove_container(utils.container_name(agent_id), force=True)
 
-        working_dir = Path(agent['working_dir'])
-        if working_dir.exists():
-            shutil.rmtree(working_dir)
+        utils.discard_tree(agent['working_dir'])
 
         return self.store.delete_agent(agent_id)
 
     def clean_agents(self, status: Optional[str] = 'stopped') -> int:
         agents = self.store.list_agents(status=status)
-        cleaned = 0
+        if not agents:
+            return 0
+
+        # One listing tells which agents still have a container; those are
+        # removed together rather than probed and removed one at a time
+        names = {agent['id']: utils.container_name(agent['id']) for agent in agents}
+        existing = set(docker_utils.list_containers(
+            all_containers=True, filter_name=utils.CONTAINER_PREFIX))
+        removed = docker_utils.bulk_remove(
+            [name for name in names.values() if name in existing], force=True)
+        agents = [agent for agent in agents if removed.get(names[agent['id']], True)]
+
+        # Working directories are independent, so delete them concurrently;
+        # a row is only dropped once its directory is really gone
+        workers = min(docker_utils.MAX_DOCKER_WORKERS, len(agents)) or 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(self._remove_workdir, agents)
+            cleaned = [agent['id'] for agent, ok in zip(agents, results) if ok]
+
+        # Drop every cleaned row with a single statement
+        self.store.delete_agents_bulk(cleaned)
+
+        return len(cleaned)
+
+    @staticmethod
+    def _remove_workdir(agent: Dict) -> bool:
+        try:
+            utils.fast_rmtree(agent['working_dir'])
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to remove {agent['working_dir']}: {e}")
+            return False
 
-        for agent in agents:
-            agent_id = agent['id']
+    def sweep_discarded_workdirs(self) -> int:
+        """Delete workdirs left behind by a background delete that failed.
 
-            try:
-                container_name = f"agent-{agent_id}"
-                if docker_utils.container_exists(container_name):
-                    docker_utils.stop_container(container_name)
-                    docker_utils.remove_container(container_name, force=True)
+        Returns how many were removed.
+        """
+        return utils.sweep_discarded_trees(utils.get_agent_base_dir(create=False))
+
+    @staticmethod
+    def _attach_command(agent_id: str) -> str:
+        return f"docker exec -it {utils.container_name(agent_id)} tmux attach -t claude"
 
-                working_dir = Path(agent['working_dir'])
-                if working_dir.exists():
-                    shutil.rmtree(working_dir)
+    def _sync_agent_statuses(self, agents: List[Dict], force: bool = False) -> List[Dict]:
+        """Mark agents whose container has exited as stopped.
 
-                self.store.delete_agent(agent_id)
-                cleaned += 1
-            except Exception:
-                pass
+        One container listing covers every agent instead of an inspect each.
+        Skipped while a StatusWatcher, here or in `fl daemon`, is keeping
+        the store current.
+        """
+        if not force and self._statuses_tracked():
+            return agents
+
+        running = [agent for agent in agents if agent['status'] == 'running']
+        if not running:
+            return agents
+
+        snapshot = docker_utils.snapshot_containers(utils.CONTAINER_PREFIX)
+        dead = [agent for agent in running
+                if snapshot.get(utils.container_name(agent['id'])) != 'running']
+
+        # One UPDATE (and one commit) for all of them
+        self.store.mark_stopped(agent['id'] for agent in dead)
+        for agent in dead:
+            agent['status'] = 'stopped'
+
+        return agents
 
-        return cleaned
+    def _running_agents(self) -> List[Dict]:
+        """Agents whose container is running, with stale rows marked stopped.
+
+        Docker filters to running containers itself, so its answer is the
+        ground truth and no per-state reconciliation is needed.
+        """
+        agents = self.store.list_agents(status='running')
+        if not agents or self._statuses_tracked():
+            return agents
+
+        alive = set(docker_utils.list_containers(
+            all_containers=False, filter_name=utils.CONTAINER_PREFIX, filter_status='running'))
+        self.store.mark_stopped(agent['id'] for agent in agents
+                                if utils.container_name(agent['id']) not in alive)
+        return [agent for agent in agents if utils.container_name(agent['id']) in alive]
+
+    def _statuses_tracked(self) -> bool:
+        """True while a StatusWatcher, here or in `fl daemon`, keeps the store current."""
+        if self._watcher is not None and self._watcher.healthy:
+            return True
+        return status_watcher.daemon_alive(self.store)
 
     def _sync_agent_status(self, agent: Dict) -> None:
         if agent['status'] == 'running':
@@ -0,0 +1,119 @@
+"""Event-driven agent status updates from `docker events`."""
+import logging
+import os
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from .store import AgentStore
+from .docker_utils import _DOCKER_BIN
+from .utils import CONTAINER_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# `fl daemon` touches its heartbeat file this often; other fl processes
+# trust the store without asking Docker while the file is fresher than
+# HEARTBEAT_TTL
+HEARTBEAT_INTERVAL = 5.0
+HEARTBEAT_TTL = 3 * HEARTBEAT_INTERVAL
+# The daemon still re-lists containers this often in case an event was missed
+RESYNC_INTERVAL = 60.0
+
+
+def heartbeat_path(store: AgentStore) -> Optional[Path]:
+    """The heartbeat file next to the store's database, if it has one."""
+    if store.db_path == ':memory:':
+        return None
+    return Path(store.db_path).with_name('status-watcher.heartbeat')
+
+
+def daemon_alive(store: AgentStore) -> bool:
+    """True while some process's watcher is keeping `store` current."""
+    path = heartbeat_path(store)
+    if path is None:
+        return False
+    try:
+        return time.time() - path.stat().st_mtime < HEARTBEAT_TTL
+    except OSError:
+        return False
+
+
+class StatusWatcher:
+    """Marks agents stopped as soon as Docker reports their container died.
+
+    One `docker events` subscription replaces re-inspecting every running
+    agent on each listing. Only worth it in long-lived processes; a single
+    CLI invocation is cheaper served by one container listing.
+    """
+
+    def __init__(self, store: AgentStore):
+        self.store = store
+        self._process: Optional[subprocess.Popen] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self.healthy:
+            return
+
+        self._process = subprocess.Popen(
+            [_DOCKER_BIN, 'events',
+             '--filter', 'type=container',
+             '--filter', 'event=die',
+             '--filter', f'name={CONTAINER_PREFIX}',
+             '--format', '{{.Actor.Attributes.name}}'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        self._thread = threading.Thread(target=self._read_events, daemon=True)
+        self._thread.start()
+
+    @property
+    def healthy(self) -> bool:
+        return (
+            self._process is not None
+            and self._process.poll() is None
+            and self._thread is not None
+            and self._thread.is_alive()
+        )
+
+    def _read_events(self):
+        for line in self._process.stdout:
+            name = line.strip()
+            if not name.startswith(CONTAINER_PREFIX):
+                continue
+            agent_id = name[len(CONTAINER_PREFIX):]
+            try:
+                # Leave 'error' and other non-running states as recorded
+                agent = self.store.get_agent(agent_id)
+                if agent and agent['status'] == 'running':
+                    self.store.update_agent(agent_id, status='stopped')
+            except Exception as e:
+                logger.debug(f"Failed to record exit of {name}: {e}")
+
+    def beat(self):
+        """Advertise to other fl processes that the store is being kept current."""
+        path = heartbeat_path(self.store)
+        if path is None:
+            return
+        try:
+            path.touch()
+        except OSError as e:
+            logger.debug(f"Failed to write heartbeat: {e}")
+
+    def stop(self):
+        path = heartbeat_path(self.store)
+        if path is not None:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            self._process.wait()
+        if self._thread is not None:
+            self._thread.join()
+        self._process = None
+        self._thread = None
@@ -1,9 +1,35 @@
 """Database layer for agent state management."""
+import atexit
 import sqlite3
 import os
+import threading
+import weakref
+from contextlib import nullcontext
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, Iterable, Iterator, List, Dict, Any, Sequence, Tuple
+
+AGENT_COLUMNS = ('id', 'repo_url', 'working_dir', 'pid', 'status', 'created_at', 'updated_at')
+OUTPUT_COLUMNS = ('id', 'agent_id', 'timestamp', 'output_type', 'content')
+
+# Rows pulled from SQLite per fetchmany() when streaming results
+FETCH_PAGE_SIZE = 256
+# Buffered add_output() rows written per executemany + commit
+OUTPUT_FLUSH_THRESHOLD = 64
+# Trade commit latency for durability against power loss
+STORE_SAFE = os.environ.get('FLETCHER_STORE_SAFE') == '1'
+
+# Stores whose buffered outputs are written at interpreter exit. Weak, so
+# an AgentStore that is dropped without close() can still be collected.
+_open_stores: "weakref.WeakSet[AgentStore]" = weakref.WeakSet()
+
+
+def _flush_open_stores():
+    for store in list(_open_stores):
+        store.flush()
+
+
+atexit.register(_flush_open_stores)
 
 
 class AgentStore:
@@ -15,9 +41,56 @@ class AgentStore:
             db_path = str(base_dir / "agents.db")
 
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
+        # Each thread gets its own connection, so readers run concurrently
+        # under WAL. SQLite still allows one writer at a time; writes take
+        # this lock so threads queue here instead of hitting SQLITE_BUSY.
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._conns: List[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        # An in-memory database exists only within its one connection, so
+        # it is shared by all threads and reads take the lock too
+        self._shared_conn: Optional[sqlite3.Connection] = None
+        if db_path == ':memory:':
+            self._shared_conn = self._connect()
+        self._read_lock = self._lock if self._shared_conn else nullcontext()
+        # add_output() rows not yet written; flushed in batches, before any
+        # output read, on close() and at interpreter exit
+        self._pending_outputs: List[Tuple[str, str, str, str]] = []
+        # In safe mode every output row is committed as it arrives
+        self._flush_threshold = 1 if STORE_SAFE else OUTPUT_FLUSH_THRESHOLD
         self._initialize_schema()
+        _open_stores.add(self)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The calling thread's connection, opened on first use."""
+        if self._shared_conn is not None:
+            return self._shared_conn
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        # check_same_thread=False only so close() can close every thread's
+        # connection; each is otherwise used by its own thread
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # WAL avoids the rollback journal's fsync pair on every commit and
+        # lets readers proceed during a write; NORMAL is durable under WAL
+        # except against power loss. FLETCHER_STORE_SAFE=1 keeps an fsync
+        # per commit (synchronous=FULL) for those who want that too.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={'FULL' if STORE_SAFE else 'NORMAL'}")
+        # Keep temp tables, the page cache (64 MiB) and reads (256 MiB mmap)
+        # in memory rather than going through read() for every page
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-65536")
+        conn.execute("PRAGMA mmap_size=268435456")
+        with self._conns_lock:
+            self._conns.append(conn)
+        return conn
 
     def _initialize_schema(self):
         cursor = self.conn.cursor()
@@ -45,93 +118,182 @@ class AgentStore:
             )
         """)
 
+        # list_agents filters on status and orders newest first; the
+        # composite index covers the filtered listing and the second one
+        # the unfiltered listing, so neither scans and sorts the table
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_agents_status_created
+            ON agents(status, created_at)
+        """)
         cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_outputs_agent_id
-            ON agent_outputs(agent_id)
+            CREATE INDEX IF NOT EXISTS idx_agents_created_at
+            ON agents(created_at)
         """)
 
+        # get_outputs filters on agent_id and orders by timestamp, so one
+        # composite index serves it as a range scan with no separate sort
+        cursor.execute("DROP INDEX IF EXISTS idx_outputs_agent_id")
+        cursor.execute("DROP INDEX IF EXISTS idx_outputs_timestamp")
         cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_outputs_timestamp
-            ON agent_outputs(timestamp)
+            CREATE INDEX IF NOT EXISTS idx_outputs_agent_ts
+            ON agent_outputs(agent_id, timestamp)
         """)
 
         self.conn.commit()
 
     def create_agent(self, agent_id: str, repo_url: str, working_dir: str,
                      pid: Optional[int] = None, status: str = "spawning") -> Dict[str, Any]:
-        cursor = self.conn.cursor()
-        now = datetime.utcnow().isoformat()
+        with self._lock:
+            cursor = self.conn.cursor()
+            now = datetime.utcnow().isoformat()
 
-        cursor.execute("""
-            INSERT INTO agents (id, repo_url, working_dir, pid, status, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (agent_id, repo_url, working_dir, pid, status, now, now))
+            cursor.execute("""
+                INSERT INTO agents (id, repo_url, working_dir, pid, status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (agent_id, repo_url, working_dir, pid, status, now, now))
 
-        self.conn.commit()
-        return self.get_agent(agent_id)
+            self.conn.commit()
+            return self.get_agent(agent_id)
 
     def get_agent(self, agent_id: str) -> Optional[Dict[str, Any]]:
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM agents WHERE id = ?", (agent_id,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
-
-    def list_agents(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
-        cursor = self.conn.cursor()
+        with self._read_lock:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT * FROM agents WHERE id = ?", (agent_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
 
+    def iter_agents(self, status: Optional[str] = None,
+                    columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Stream agents newest first, optionally fetching only `columns`."""
+        query = f"SELECT {self._select_list(columns, AGENT_COLUMNS)} FROM agents"
+        params: tuple = ()
         if status:
-            cursor.execute("SELECT * FROM agents WHERE status = ? ORDER BY created_at DESC", (status,))
-        else:
-            cursor.execute("SELECT * FROM agents ORDER BY created_at DESC")
+            query += " WHERE status = ?"
+            params = (status,)
+        query += " ORDER BY created_at DESC"
+        return self._iter_rows(query, params)
 
-        return [dict(row) for row in cursor.fetchall()]
+    def list_agents(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        return list(self.iter_agents(status=status))
 
     def update_agent(self, agent_id: str, **kwargs) -> bool:
-        if not kwargs:
-            return False
+        with self._lock:
+            if not kwargs:
+                return False
 
-        kwargs['updated_at'] = datetime.utcnow().isoformat()
+            kwargs['updated_at'] = datetime.utcnow().isoformat()
 
-        fields = ', '.join(f"{k} = ?" for k in kwargs.keys())
-        values = list(kwargs.values()) + [agent_id]
+            fields = ', '.join(f"{k} = ?" for k in kwargs.keys())
+            values = list(kwargs.values()) + [agent_id]
 
-        cursor = self.conn.cursor()
-        cursor.execute(f"UPDATE agents SET {fields} WHERE id = ?", values)
-        self.conn.commit()
+            cursor = self.conn.cursor()
+            cursor.execute(f"UPDATE agents SET {fields} WHERE id = ?", values)
+            self.conn.commit()
+
+            return cursor.rowcount > 0
 
-        return cursor.rowcount > 0
+    def mark_stopped(self, agent_ids: Iterable[str]) -> int:
+        """Set status='stopped' on many agents in one statement and commit."""
+        agent_ids = list(agent_ids)
+        if not agent_ids:
+            return 0
+
+        with self._lock:
+            placeholders = ', '.join('?' for _ in agent_ids)
+            cursor = self.conn.cursor()
+            cursor.execute(
+                f"UPDATE agents SET status = 'stopped', updated_at = ? WHERE id IN ({placeholders})",
+                [datetime.utcnow().isoformat(), *agent_ids]
+            )
+            self.conn.commit()
+            return cursor.rowcount
 
     def delete_agent(self, agent_id: str) -> bool:
-        cursor = self.conn.cursor()
-        cursor.execute("DELETE FROM agents WHERE id = ?", (agent_id,))
-        self.conn.commit()
-        return cursor.rowcount > 0
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute("DELETE FROM agents WHERE id = ?", (agent_id,))
+            self.conn.commit()
+            return cursor.rowcount > 0
 
-    def add_output(self, agent_id: str, output_type: str, content: str):
-        cursor = self.conn.cursor()
-        timestamp = datetime.utcnow().isoformat()
+    def delete_agents_bulk(self, agent_ids: Iterable[str]) -> int:
+        """Delete many agents in one statement and commit."""
+        agent_ids = list(agent_ids)
+        if not agent_ids:
+            return 0
 
-        cursor.execute("""
-            INSERT INTO agent_outputs (agent_id, timestamp, output_type, content)
-            VALUES (?, ?, ?, ?)
-        """, (agent_id, timestamp, output_type, content))
+        with self._lock:
+            placeholders = ', '.join('?' for _ in agent_ids)
+            cursor = self.conn.cursor()
+            cursor.execute(f"DELETE FROM agents WHERE id IN ({placeholders})", agent_ids)
+            self.conn.commit()
+            return cursor.rowcount
 
-        self.conn.commit()
+    def add_output(self, agent_id: str, output_type: str, content: str):
+        """Queue one output row; it is written once the buffer fills or on flush()."""
+        timestamp = datetime.utcnow().isoformat()
+        with self._lock:
+            self._pending_outputs.append((agent_id, timestamp, output_type, content))
+            if len(self._pending_outputs) >= self._flush_threshold:
+                self.flush()
 
-    def get_outputs(self, agent_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
-        cursor = self.conn.cursor()
+    def flush(self):
+        """Write buffered add_output() rows with one executemany + commit."""
+        with self._lock:
+            if not self._pending_outputs:
+                return
+            rows, self._pending_outputs = self._pending_outputs, []
+            self.conn.executemany("""
+                INSERT INTO agent_outputs (agent_id, timestamp, output_type, content)
+                VALUES (?, ?, ?, ?)
+            """, rows)
+            self.conn.commit()
 
-        query = """
-            SELECT * FROM agent_outputs
+    def iter_outputs(self, agent_id: str, limit: Optional[int] = None,
+                     columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Stream an agent's outputs oldest first, optionally only `columns`."""
+        query = f"""
+            SELECT {self._select_list(columns, OUTPUT_COLUMNS)} FROM agent_outputs
             WHERE agent_id = ?
             ORDER BY timestamp ASC
+            LIMIT ?
         """
 
-        if limit:
-            query += f" LIMIT {limit}"
+        self.flush()
+        # LIMIT -1 is unbounded in SQLite; binding it keeps the SQL text
+        # constant so the statement cache can reuse it
+        return self._iter_rows(query, (agent_id, limit if limit else -1))
+
+    def get_outputs(self, agent_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        return list(self.iter_outputs(agent_id, limit=limit))
+
+    @staticmethod
+    def _select_list(columns: Optional[Sequence[str]], allowed: Tuple[str, ...]) -> str:
+        if not columns:
+            return "*"
+        unknown = set(columns) - set(allowed)
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+        return ", ".join(columns)
+
+    def _iter_rows(self, query: str, params: tuple) -> Iterator[Dict[str, Any]]:
+        # Rows are fetched in pages and yielded between fetches, so a slow
+        # consumer never holds every row in memory
+        with self._read_lock:
+            cursor = self.conn.cursor()
+            cursor.execute(query, params)
 
-        cursor.execute(query, (agent_id,))
-        return [dict(row) for row in cursor.fetchall()]
+        while True:
+            with self._read_lock:
+                rows = cursor.fetchmany(FETCH_PAGE_SIZE)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
 
     def close(self):
-        self.conn.close()
+        self.flush()
+        _open_stores.discard(self)
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
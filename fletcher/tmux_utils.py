@@ -0,0 +1,49 @@
+"""Host-side tmux helpers for the agent dashboard."""
+import os
+import shutil
+import subprocess
+from typing import List, Set
+
+# Resolved once so each call skips the PATH walk; an absolute path with
+# close_fds=False also keeps subprocess on the posix_spawn fast path
+_TMUX_FOUND = shutil.which('tmux')
+_TMUX_PATH = _TMUX_FOUND or 'tmux'
+
+
+def is_available() -> bool:
+    """Whether tmux was on PATH when fletcher started."""
+    return _TMUX_FOUND is not None
+
+
+def list_sessions() -> Set[str]:
+    """Names of all sessions on the tmux server, empty if none is running."""
+    result = subprocess.run(
+        [_TMUX_PATH, 'list-sessions', '-F', '#{session_name}'],
+        capture_output=True,
+        check=False,
+        close_fds=False
+    )
+    if result.returncode != 0:
+        return set()
+    return set(result.stdout.decode().splitlines())
+
+
+def run_commands(commands: List[List[str]]):
+    """Run several tmux commands through a single client invocation.
+
+    tmux stops at the first failing command, and check=True surfaces it.
+    """
+    argv = [_TMUX_PATH]
+    for i, command in enumerate(commands):
+        if i:
+            argv.append(';')
+        argv.extend(command)
+    subprocess.run(argv, check=True)
+
+
+def attach_session(name: str):
+    """Switch the current client to `name`, or attach if outside tmux."""
+    if os.environ.get('TMUX'):
+        subprocess.run([_TMUX_PATH, 'switch-client', '-t', name])
+    else:
+        subprocess.run([_TMUX_PATH, 'attach', '-t', name])
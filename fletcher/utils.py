@@ -1,45 +1,118 @@
 """Utility functions for agent management."""
+import functools
 import os
+import secrets
 import shutil
+import signal
 import subprocess
-import uuid
+import time
 from pathlib import Path
 from typing import Optional
-import git
+
+from . import docker_utils
+from .docker_utils import check_docker_available
+
+
+CONTAINER_PREFIX = "agent-"
 
 
 def generate_agent_id() -> str:
-    return str(uuid.uuid4())[:8]
+    return secrets.token_hex(4)
+
+
+def container_name(agent_id: str) -> str:
+    """Name of the Docker container an agent runs in."""
+    return f"{CONTAINER_PREFIX}{agent_id}"
+
 
+# A positive daemon check is trusted for this long, in-process and
+# across CLI invocations via the marker file below.
+DOCKER_RUNNING_TTL = 60.0
+DOCKER_RUNNING_MARKER = (
+    Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'fletcher' / 'docker-ok'
+)
 
+_docker_running_cache: dict = {}
+
+
+@functools.lru_cache(maxsize=1)
 def check_claude_cli() -> bool:
     return shutil.which("claude") is not None
 
 
+@functools.lru_cache(maxsize=1)
 def get_claude_cli_path() -> Optional[str]:
     return shutil.which("claude")
 
 
-def clone_repository(repo_url: str, target_dir: str, progress_callback=None) -> bool:
-    try:
-        target_path = Path(target_dir)
-        target_path.parent.mkdir(parents=True, exist_ok=True)
-
-        if progress_callback:
-            git.Repo.clone_from(
-                repo_url,
-                target_dir,
-                progress=progress_callback
-            )
-        else:
-            git.Repo.clone_from(repo_url, target_dir)
+def invalidate_which_cache():
+    """Forget cached binary lookups, for the rare case PATH changes."""
+    check_claude_cli.cache_clear()
+    get_claude_cli_path.cache_clear()
+    check_docker_available.cache_clear()
+    validate_claude_cli.cache_clear()
+    validate_docker.cache_clear()
+
+
+def clone_repository(
+    repo_url: str,
+    target_dir: str,
+    progress_callback=None,
+    depth: Optional[int] = 1,
+    blob_filter: Optional[str] = None,
+) -> bool:
+    """Clone `repo_url` into `target_dir`.
+
+    By default only the tip of the default branch is fetched, without tags;
+    agents branch from HEAD and rarely need history. Pass depth=None for a
+    full clone.
+    `blob_filter` (e.g. 'blob:none') requests a partial clone; it is off by
+    default because a depth-1 checkout needs every HEAD blob anyway, and the
+    filter only adds a second fetch round-trip for them.
+    """
+    target_path = Path(target_dir)
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+
+    options = {}
+    if depth:
+        options.update(depth=depth, single_branch=True, no_tags=True)
+    if blob_filter:
+        options['filter'] = blob_filter
+
+    if progress_callback:
+        # GitPython parses the --progress protocol for RemoteProgress; it is
+        # imported only here since loading it costs more than the CLI does
+        import git
+        git.Repo.clone_from(repo_url, target_dir, progress=progress_callback, **options)
+    else:
+        _run_git(['clone', *_clone_flags(options), '--', repo_url, target_dir])
 
-        return True
-    except git.exc.GitCommandError as e:
-        raise e
+    return True
+
+
+def _clone_flags(options: dict) -> list:
+    flags = []
+    if 'depth' in options:
+        flags.append(f"--depth={options['depth']}")
+    if options.get('single_branch'):
+        flags.append('--single-branch')
+    if options.get('no_tags'):
+        flags.append('--no-tags')
+    if 'filter' in options:
+        flags.append(f"--filter={options['filter']}")
+    return flags
 
 
-def get_agent_base_dir(custom_path: Optional[str] = None) -> Path:
+def _run_git(args: list) -> None:
+    """Run the git CLI, raising GitCommandError like GitPython would."""
+    command = ['git', *args]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        import git
+        raise git.exc.GitCommandError(command, result.returncode, result.stderr.strip())
+
+
+def get_agent_base_dir(custom_path: Optional[str] = None, create: bool = True) -> Path:
     if custom_path:
         base_dir = Path(custom_path).expanduser().resolve()
     else:
@@ -49,7 +122,8 @@ def get_agent_base_dir(custom_path: Optional[str] = None) -> Path:
         else:
             base_dir = Path.cwd() / ".agents"
 
-    base_dir.mkdir(parents=True, exist_ok=True)
+    if create:
+        base_dir.mkdir(parents=True, exist_ok=True)
     return base_dir
 
 
@@ -57,25 +131,97 @@ def get_agent_working_dir(agent_id: str) -> Path:
     return get_agent_base_dir() / agent_id
 
 
-def remove_agent_directory(agent_id: str) -> bool:
-    working_dir = get_agent_working_dir(agent_id)
-    if working_dir.exists():
-        shutil.rmtree(working_dir)
-        return True
-    return False
+def fast_rmtree(path) -> None:
+    """Delete a directory tree, much faster than shutil.rmtree on big clones.
+
+    Prefers one `rm -rf` (a C walk of .git/objects) over shutil's
+    per-entry Python recursion; without rm, walks with os.scandir directly.
+    A path that doesn't exist is not an error, so callers needn't check first.
+    """
+    rm = shutil.which('rm')
+    if rm:
+        subprocess.run([rm, '-rf', '--', str(path)], check=True)
+        return
+    try:
+        _scandir_rmtree(str(path))
+    except FileNotFoundError:
+        pass
+
+
+def discard_tree(path) -> None:
+    """Make `path` disappear at once and delete its contents in the background.
+
+    The directory is renamed to a hidden sibling, so the agent's workdir is
+    gone as soon as this returns; a detached `rm -rf` then deletes it and
+    finishes even if we exit first. Falls back to fast_rmtree() when the
+    rename or the background rm isn't possible.
+    """
+    path = Path(path)
+    doomed = path.with_name(f".{path.name}.deleting-{secrets.token_hex(3)}")
+    try:
+        os.rename(path, doomed)
+    except FileNotFoundError:
+        return
+    except OSError:
+        fast_rmtree(path)
+        return
+
+    rm = shutil.which('rm')
+    if not rm:
+        fast_rmtree(doomed)
+        return
+    subprocess.Popen(
+        [rm, '-rf', '--', str(doomed)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def sweep_discarded_trees(parent) -> int:
+    """Delete leftovers of discard_tree() whose background rm didn't finish.
+
+    Returns how many were removed; ones that still can't be deleted are
+    left for the next sweep.
+    """
+    parent = Path(parent)
+    if not parent.is_dir():
+        return 0
+
+    removed = 0
+    for doomed in parent.glob('.*.deleting-*'):
+        try:
+            fast_rmtree(doomed)
+        except (OSError, subprocess.CalledProcessError):
+            continue
+        if not doomed.exists():
+            removed += 1
+    return removed
+
+
+def _scandir_rmtree(path: str) -> None:
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                _scandir_rmtree(entry.path)
+            else:
+                os.unlink(entry.path)
+    os.rmdir(path)
 
 
 def is_process_running(pid: int) -> bool:
     try:
         os.kill(pid, 0)
         return True
+    except PermissionError:
+        # EPERM: the process exists but belongs to another user
+        return True
     except (OSError, TypeError):
         return False
 
 
 def terminate_process(pid: int, timeout: int = 5) -> bool:
     try:
-        import signal
         os.kill(pid, signal.SIGTERM)
         return True
     except (OSError, TypeError):
@@ -83,37 +229,82 @@ def terminate_process(pid: int, timeout: int = 5) -> bool:
 
 
 def create_and_checkout_branch(repo_path: str, branch_name: str) -> bool:
-    try:
-        repo = git.Repo(repo_path)
-        repo.git.checkout('-b', branch_name)
-        return True
-    except git.exc.GitCommandError as e:
-        raise e
+    _run_git(['-C', repo_path, 'checkout', '-q', '-b', branch_name])
+    return True
+
+
+VALID_REPO_PREFIXES = ('http://', 'https://', 'git@', 'git://')
 
 
 def validate_repo_url(repo_url: str) -> None:
-    valid_prefixes = ('http://', 'https://', 'git@', 'git://')
-    if not any(repo_url.startswith(prefix) for prefix in valid_prefixes):
+    if not repo_url.startswith(VALID_REPO_PREFIXES):
         raise ValueError(f"Invalid repository URL: {repo_url}")
 
 
-def check_docker_available() -> bool:
-    return shutil.which('docker') is not None
+def _docker_ok_cached() -> bool:
+    now = time.time()
+    checked_at = _docker_running_cache.get('checked_at')
+    if checked_at is not None and now - checked_at < DOCKER_RUNNING_TTL:
+        return True
+
+    try:
+        if now - DOCKER_RUNNING_MARKER.stat().st_mtime < DOCKER_RUNNING_TTL:
+            _docker_running_cache['checked_at'] = now
+            return True
+    except OSError:
+        pass
+    return False
+
+
+def _remember_docker_ok():
+    # Only positive results are cached so a daemon start is noticed at once
+    _docker_running_cache['checked_at'] = time.time()
+    try:
+        DOCKER_RUNNING_MARKER.parent.mkdir(parents=True, exist_ok=True)
+        DOCKER_RUNNING_MARKER.touch()
+    except OSError:
+        pass
+
+
+def check_docker() -> bool:
+    """Check the docker CLI is installed and its daemon answers, in one call.
 
+    `docker version` needs the server to report a version, so success covers
+    both check_docker_available() and a running daemon. The answer is cached
+    for DOCKER_RUNNING_TTL.
+    """
+    if _docker_ok_cached():
+        return True
+
+    # A daemon answering on the local socket still needs the CLI for attach
+    if check_docker_available():
+        alive = docker_utils.ping_socket()
+        if alive is not None:
+            if alive:
+                _remember_docker_ok()
+            return alive
 
-def check_docker_running() -> bool:
     try:
         result = subprocess.run(
-            ['docker', 'info'],
+            [docker_utils._DOCKER_BIN, 'version', '--format', '{{.Server.Version}}'],
             capture_output=True,
             check=False,
-            timeout=5
+            close_fds=False,
+            timeout=2
         )
-        return result.returncode == 0
     except Exception:
         return False
 
+    if result.returncode != 0:
+        return False
+
+    _remember_docker_ok()
+    return True
 
+
+# The validators raise on failure and lru_cache doesn't keep exceptions, so
+# only successful checks are remembered for the rest of the process
+@functools.lru_cache(maxsize=1)
 def validate_claude_cli():
     if not check_claude_cli():
         raise RuntimeError(
@@ -122,7 +313,11 @@ def validate_claude_cli():
         )
 
 
+@functools.lru_cache(maxsize=1)
 def validate_docker():
+    if check_docker():
+        return
+
     if not check_docker_available():
         raise RuntimeError(
             "Docker not found. Please install Docker:\n"
@@ -130,5 +325,4 @@ def validate_docker():
             "  Linux: https://docs.docker.com/engine/install/"
         )
 
-    if not check_docker_running():
-        raise RuntimeError("Docker daemon is not running. Please start Docker.")
+    raise RuntimeError("Docker daemon is not running. Please start Docker.")
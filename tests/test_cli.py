@@ -0,0 +1,22 @@
+"""Tests for Fletcher CLI helpers."""
+import click
+
+from fletcher.cli import _format_table
+
+
+def test_format_table_ignores_ansi_codes():
+    """Test that coloured cells are padded by their visible width."""
+    headers = ['ID', 'STATUS', 'REPO']
+    rows = [
+        ['abc', click.style('running', fg='green'), 'https://x/repo'],
+        ['defgh', click.style('error', fg='red'), 'r'],
+    ]
+
+    lines = [click.unstyle(line) for line in _format_table(headers, rows).splitlines()]
+
+    assert lines == [
+        'ID     STATUS   REPO',
+        '-----  -------  --------------',
+        'abc    running  https://x/repo',
+        'defgh  error    r',
+    ]
@@ -0,0 +1,67 @@
+"""Tests for Fletcher Docker helpers."""
+import pytest
+import tempfile
+import shutil
+import subprocess
+from pathlib import Path
+
+from fletcher import docker_utils
+
+
+@pytest.fixture
+def build_context(monkeypatch):
+    """Point the image build context at a temporary directory."""
+    temp_dir = tempfile.mkdtemp()
+    context = Path(temp_dir)
+    (context / "Dockerfile").write_text("FROM scratch\nCOPY entrypoint.sh /entrypoint.sh\n")
+    (context / "entrypoint.sh").write_text("#!/bin/sh\n")
+    monkeypatch.setattr(docker_utils, '_DOCKERFILE_DIR', str(context))
+
+    yield context
+
+    # Cleanup
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_build_hash_tracks_copied_files(build_context):
+    """Test that the hash changes with the Dockerfile and the files it COPYs."""
+    original = docker_utils.compute_build_hash()
+    assert docker_utils.compute_build_hash() == original
+
+    (build_context / "entrypoint.sh").write_text("#!/bin/sh\nexec claude\n")
+    changed = docker_utils.compute_build_hash()
+    assert changed != original
+
+    (build_context / "Dockerfile").write_text("FROM scratch\nCOPY entrypoint.sh /e.sh\n")
+    assert docker_utils.compute_build_hash() != changed
+
+
+def test_build_hash_ignores_files_outside_the_build(build_context):
+    """Test that files the Dockerfile doesn't use don't force a rebuild."""
+    original = docker_utils.compute_build_hash()
+
+    (build_context / "README.md").write_text("notes")
+    assert docker_utils.compute_build_hash() == original
+
+
+@pytest.mark.parametrize('status, removed', [(204, True), (404, True), (409, False)])
+def test_remove_container_api_treats_missing_as_removed(monkeypatch, status, removed):
+    """Test that a 404 from the API counts as removed but a conflict doesn't."""
+    monkeypatch.setattr(docker_utils, '_api', lambda method, path, **kwargs: (status, b''))
+
+    assert docker_utils.remove_container('agent-x', force=True) is removed
+
+
+@pytest.mark.parametrize('stderr, removed', [
+    (b'Error: No such container: agent-x', True),
+    (b'Error: container is running', False),
+])
+def test_remove_container_cli_treats_missing_as_removed(monkeypatch, stderr, removed):
+    """Test the CLI fallback reads "No such container" as already removed."""
+    def fake_run(cmd, **kwargs):
+        raise subprocess.CalledProcessError(1, cmd, stderr=stderr)
+
+    monkeypatch.setattr(docker_utils, '_api', lambda method, path, **kwargs: None)
+    monkeypatch.setattr(docker_utils.subprocess, 'run', fake_run)
+
+    assert docker_utils.remove_container('agent-x') is removed
@@ -2,8 +2,10 @@
 import pytest
 import tempfile
 import shutil
+import threading
 from pathlib import Path
 
+from fletcher import docker_utils
 from fletcher.manager import AgentManager
 from fletcher.store import AgentStore
 
@@ -47,5 +49,62 @@ def test_get_nonexistent_agent(manager):
     assert agent is None
 
 
+def test_spawn_agents_collects_errors(manager, monkeypatch):
+    """Test that one failed spawn doesn't abort the others."""
+    def fake_spawn(repo_url, depth=1):
+        if 'bad' in repo_url:
+            raise RuntimeError("clone failed")
+        return repo_url.rsplit('/', 1)[-1]
+
+    monkeypatch.setattr(manager, 'spawn_agent', fake_spawn)
+    results = manager.spawn_agents(['https://x/good', 'https://x/bad'])
+
+    assert results[0] == ('https://x/good', 'good', None)
+    assert results[1][1] is None
+    assert isinstance(results[1][2], RuntimeError)
+
+
+def test_spawn_agents_interrupted_tears_down(manager, monkeypatch):
+    """Test that an interrupted parallel spawn deletes the agents it made."""
+    started = threading.Event()
+
+    def fake_spawn(repo_url, depth=1):
+        if 'interrupt' in repo_url:
+            started.wait(5)
+            raise KeyboardInterrupt
+        started.set()
+        return repo_url.rsplit('/', 1)[-1]
+
+    deleted = []
+    monkeypatch.setattr(manager, 'spawn_agent', fake_spawn)
+    monkeypatch.setattr(manager, 'delete_agent', deleted.append)
+
+    with pytest.raises(KeyboardInterrupt):
+        manager.spawn_agents(['https://x/interrupt', 'https://x/good'])
+
+    assert deleted == ['good']
+
+
+def test_list_running_agents_uses_docker_filter(manager, monkeypatch):
+    """Test that `list -s running` trusts Docker's running filter."""
+    for agent_id in ('alive', 'dead'):
+        manager.store.create_agent(agent_id, f"https://x/{agent_id}", f"/tmp/{agent_id}",
+                                   status="running")
+
+    calls = []
+
+    def fake_list_containers(**kwargs):
+        calls.append(kwargs)
+        return ['agent-alive']
+
+    monkeypatch.setattr(docker_utils, 'list_containers', fake_list_containers)
+
+    agents = manager.list_agents(status='running')
+
+    assert [agent['id'] for agent in agents] == ['alive']
+    assert calls[0]['filter_status'] == 'running'
+    assert manager.store.get_agent('dead')['status'] == 'stopped'
+
+
 # Note: Additional tests would require mocking git clone and Claude CLI
 # or using integration tests with real repositories
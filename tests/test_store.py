@@ -0,0 +1,157 @@
+"""Tests for Fletcher agent store."""
+import pytest
+import tempfile
+import shutil
+import sqlite3
+import threading
+import weakref
+from pathlib import Path
+
+from fletcher import store as store_module
+from fletcher.store import AgentStore, OUTPUT_FLUSH_THRESHOLD
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory for databases."""
+    temp_dir = tempfile.mkdtemp()
+
+    yield Path(temp_dir)
+
+    # Cleanup
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def temp_db(temp_dir):
+    """Create a temporary database for testing."""
+    store = AgentStore(str(temp_dir / "test.db"))
+
+    yield store
+
+    store.close()
+
+
+def _add_agents(store, *agent_ids, status="running"):
+    for agent_id in agent_ids:
+        store.create_agent(agent_id, f"https://x/{agent_id}", f"/tmp/{agent_id}", status=status)
+
+
+def _written_outputs(store):
+    """Count output rows on disk, bypassing the store's buffer."""
+    conn = sqlite3.connect(store.db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM agent_outputs").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_connections_are_thread_local(temp_db):
+    """Test that each thread gets its own connection and sees committed writes."""
+    _add_agents(temp_db, "main")
+    seen = {}
+
+    def worker(name):
+        seen[name] = (temp_db.conn, temp_db.get_agent("main") is not None)
+        _add_agents(temp_db, name)
+
+    threads = [threading.Thread(target=worker, args=(f"t{i}",)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    conns = {id(conn) for conn, _ in seen.values()}
+    assert len(conns) == 3
+    assert id(temp_db.conn) not in conns
+    assert all(found for _, found in seen.values())
+    assert len(temp_db.list_agents()) == 4
+
+
+def test_mark_stopped(temp_db):
+    """Test that mark_stopped only updates the given agents."""
+    _add_agents(temp_db, "a", "b", "c")
+
+    assert temp_db.mark_stopped(["a", "b", "missing"]) == 2
+    assert temp_db.mark_stopped([]) == 0
+
+    statuses = {agent['id']: agent['status'] for agent in temp_db.list_agents()}
+    assert statuses == {"a": "stopped", "b": "stopped", "c": "running"}
+
+
+def test_delete_agents_bulk(temp_db):
+    """Test deleting several agents in one call."""
+    _add_agents(temp_db, "a", "b", "c")
+
+    assert temp_db.delete_agents_bulk(["a", "c", "missing"]) == 2
+    assert temp_db.delete_agents_bulk([]) == 0
+
+    assert [agent['id'] for agent in temp_db.list_agents()] == ["b"]
+
+
+def test_iter_agents_streams_selected_columns(temp_db):
+    """Test that iter_agents yields rows lazily with only the requested columns."""
+    _add_agents(temp_db, "a", "b")
+    temp_db.update_agent("b", status="stopped")
+
+    rows = temp_db.iter_agents(status="running", columns=['id', 'status'])
+    assert not isinstance(rows, list)
+    assert list(rows) == [{'id': "a", 'status': "running"}]
+
+    with pytest.raises(ValueError):
+        temp_db.iter_agents(columns=['id', 'password'])
+
+
+def test_iter_outputs_limit(temp_db):
+    """Test that no limit returns every row (LIMIT -1) and a limit caps them."""
+    _add_agents(temp_db, "a")
+    for i in range(5):
+        temp_db.add_output("a", "stdout", f"line {i}")
+
+    assert len(list(temp_db.iter_outputs("a"))) == 5
+    assert [row['content'] for row in temp_db.iter_outputs("a", limit=2)] == ["line 0", "line 1"]
+    assert list(temp_db.iter_outputs("a", columns=['content'], limit=1)) == [{'content': "line 0"}]
+
+
+def test_add_output_buffers_until_threshold(temp_db):
+    """Test that outputs are written in batches of OUTPUT_FLUSH_THRESHOLD."""
+    _add_agents(temp_db, "a")
+
+    for i in range(OUTPUT_FLUSH_THRESHOLD - 1):
+        temp_db.add_output("a", "stdout", f"line {i}")
+    assert _written_outputs(temp_db) == 0
+
+    temp_db.add_output("a", "stdout", "last")
+    assert _written_outputs(temp_db) == OUTPUT_FLUSH_THRESHOLD
+
+
+def test_add_output_flushed_before_read(temp_db):
+    """Test that reading outputs sees rows still in the buffer."""
+    _add_agents(temp_db, "a")
+    temp_db.add_output("a", "stdout", "hello")
+
+    outputs = temp_db.get_outputs("a")
+    assert [output['content'] for output in outputs] == ["hello"]
+    assert _written_outputs(temp_db) == 1
+
+
+def test_unclosed_store_can_be_collected(temp_dir):
+    """Test that the exit-time flush doesn't keep stores alive."""
+    store = AgentStore(str(temp_dir / "dropped.db"))
+    ref = weakref.ref(store)
+    del store
+
+    assert ref() is None
+
+
+def test_add_output_safe_mode_writes_immediately(temp_dir, monkeypatch):
+    """Test that FLETCHER_STORE_SAFE=1 commits every output row."""
+    monkeypatch.setattr(store_module, 'STORE_SAFE', True)
+    store = AgentStore(str(temp_dir / "safe.db"))
+    try:
+        _add_agents(store, "a")
+        store.add_output("a", "stdout", "hello")
+        assert _written_outputs(store) == 1
+        assert store.conn.execute("PRAGMA synchronous").fetchone()[0] == 2  # FULL
+    finally:
+        store.close()
@@ -0,0 +1,61 @@
+"""Tests for Fletcher utility helpers."""
+import pytest
+import tempfile
+import shutil
+import time
+from pathlib import Path
+
+from fletcher import utils
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory for agent workdirs."""
+    temp_dir = tempfile.mkdtemp()
+
+    yield Path(temp_dir)
+
+    # Cleanup
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _make_tree(path: Path):
+    (path / "repo" / ".git").mkdir(parents=True)
+    (path / "repo" / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+    (path / "repo" / "file.txt").write_text("hello")
+
+
+def test_discard_tree_removes_path_at_once(temp_dir):
+    """Test that the workdir is gone on return and deleted in the background."""
+    workdir = temp_dir / "abc123"
+    _make_tree(workdir)
+
+    utils.discard_tree(workdir)
+    assert not workdir.exists()
+
+    deadline = time.monotonic() + 5
+    while list(temp_dir.iterdir()) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert list(temp_dir.iterdir()) == []
+
+
+def test_discard_tree_missing_path(temp_dir):
+    """Test that discarding a path that doesn't exist is not an error."""
+    utils.discard_tree(temp_dir / "missing")
+
+
+def test_sweep_discarded_trees(temp_dir):
+    """Test that only leftover .deleting-* directories are swept."""
+    _make_tree(temp_dir / ".abc123.deleting-0f0f0f")
+    _make_tree(temp_dir / "def456")
+
+    assert utils.sweep_discarded_trees(temp_dir) == 1
+    assert [path.name for path in temp_dir.iterdir()] == ["def456"]
+
+
+def test_sweep_discarded_trees_missing_base(temp_dir):
+    """Test that sweeping a base dir that doesn't exist doesn't create it."""
+    base = temp_dir / ".agents"
+
+    assert utils.sweep_discarded_trees(base) == 0
+    assert not base.exists()